@@ -1,11 +1,3 @@
-import requests
-import os
-import html
-import json
-import math
-from pathlib import Path
-from functools import lru_cache
-from typing import Optional
 import huggingface_hub
 
 # Monkeypatch HfFolder to support older Gradio versions with newer huggingface_hub
@@ -18,236 +10,36 @@ if not hasattr(huggingface_hub, "HfFolder"):
 
 import gradio as gr
 
-# =============== 7-11 所需常數 ===============
-# 請確認此處的 MID_V 是否有效，若過期請更新
-MID_V = "W0_DiF4DlgU5OeQoRswrRcaaNHMWOL7K3ra3381ocZUv-rdOWy-ZuIItG6T-7pjiccl0C5h41-cHaupfvgcXKJKifEvNt9NiU94M_ZVp42Ig7JEn15la5iV0H3-8dZfASc7Mgke95qb9LYu3ghJ5Sam6D0LAnYK9Lb0DZohVkl1N5OTvWXvPb4VqEek"
-USER_AGENT_7_11 = "Mozilla/5.0 (iPhone; CPU iPhone OS 17_6_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148"
-API_7_11_BASE = "https://lovefood.openpoint.com.tw/LoveFood/api"
-DATA_DIR = Path(__file__).resolve().parent / "data"
-SEVEN_ELEVEN_STORES_PATH = DATA_DIR / "seven_eleven_stores.json"
-
-# =============== FamilyMart 所需常數 ===============
-FAMILY_PROJECT_CODE = "202106302"  # 若有需要請自行調整
-API_FAMILY = "https://stamp.family.com.tw/api/maps/MapProductInfo"
-
-TAG_ICONS = {
-    "麵": "🍜",
-    "湯": "🥣",
-    "飯": "🍚",
-    "飯糰": "🍙",
-}
-
-
-def categorize_tags(text: str):
-    if not text:
-        return []
-    tags = []
-    if "飯糰" in text:
-        tags.append("飯糰")
-    if "麵" in text:
-        tags.append("麵")
-    if "湯" in text:
-        tags.append("湯")
-    if "飯" in text and "飯糰" not in text:
-        tags.append("飯")
-    return tags
-
-
-def build_store_key(store_type: str, store_id: str):
-    return f"{store_type}:{store_id}"
-
-
-@lru_cache(maxsize=1)
-def load_7_11_fallback_stores():
-    if not SEVEN_ELEVEN_STORES_PATH.exists():
-        print(f"⚠️ 找不到 7-11 fallback 資料: {SEVEN_ELEVEN_STORES_PATH}")
-        return []
-
-    with SEVEN_ELEVEN_STORES_PATH.open("r", encoding="utf-8") as f:
-        payload = json.load(f)
-    return payload.get("stores", [])
-
-
-def haversine_meters(lat1, lon1, lat2, lon2):
-    radius_m = 6371000
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    delta_phi = math.radians(lat2 - lat1)
-    delta_lambda = math.radians(lon2 - lon1)
-    a = (
-        math.sin(delta_phi / 2) ** 2
-        + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
-    )
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return radius_m * c
+from search_core.cancellation import SearchCancelled, SessionSearches, with_cancel_token
+from search_core.config import CLIENT_SIDE_FILTERING, JSON_API_ENABLED, MAX_SEARCH_RADIUS_KM
+from search_core.filters import filter_results, render_filtered_view, render_results_page, restrict_to_favorites
+from search_core.geocode import geocode_address
+from search_core.providers import fetch_nearby_stores_data, providers_for_filter, stream_nearby_stores
+from search_core.render import CLIENT_FILTER_JS, render_error
+from search_core.results import ResultSet, ResultView
+from search_core.sessions import ResultHandle, get_runtime_stats, session_results
+from search_core.tags import TAG_ICONS
 
 
-def build_favorite_choices(results, selected):
+def build_favorite_choices(view, selected):
+    """由篩選後的 ResultView 建立愛店選項，依距離排序。"""
+    results = view.results
     stores = {}
-    for r in results:
-        key = r["store_key"]
-        store_name = r.get("store_name") or ""
-        label = f"{r['store_type']} {store_name}"
-        dist = r.get("distance_m", 0)
-        if key not in stores or dist < stores[key]["distance_m"]:
-            stores[key] = {"label": label, "distance_m": dist}
+    for store_idx in view.store_indices():
+        stores[results.store_keys[store_idx]] = (
+            f"{results.store_types[store_idx]} {results.store_names[store_idx] or ''}",
+            results.store_distances[store_idx],
+        )
 
     choices = [
-        (v["label"], key)
-        for key, v in sorted(stores.items(), key=lambda item: item[1]["distance_m"])
+        (label, key)
+        for key, (label, _) in sorted(stores.items(), key=lambda item: item[1][1])
     ]
-    selected_set = set(selected or [])
     selected_values = [key for key in (selected or []) if key in stores]
-    if selected_set:
-        selected_values = [key for key in (selected or []) if key in stores]
     return gr.update(choices=choices, value=selected_values)
 
 
-def get_7_11_token():
-    url = f"{API_7_11_BASE}/Auth/FrontendAuth/AccessToken?mid_v={MID_V}"
-    headers = {"user-agent": USER_AGENT_7_11}
-    resp = requests.post(url, headers=headers, data="")
-    resp.raise_for_status()
-    js = resp.json()
-    if not js.get("isSuccess"):
-        raise RuntimeError(f"取得 7-11 token 失敗: {js}")
-    return js["element"]
-
-def get_7_11_nearby_stores(token, lat, lon):
-    url = f"{API_7_11_BASE}/Search/FrontendStoreItemStock/GetNearbyStoreList?token={token}"
-    headers = {
-        "user-agent": USER_AGENT_7_11,
-        "content-type": "application/json",
-    }
-    body = {
-        "CurrentLocation": {"Latitude": lat, "Longitude": lon},
-        "SearchLocation": {"Latitude": lat, "Longitude": lon}
-    }
-    resp = requests.post(url, headers=headers, json=body)
-    resp.raise_for_status()
-    js = resp.json()
-    if not js.get("isSuccess"):
-        raise RuntimeError(f"取得 7-11 附近門市失敗: {js}")
-    return js["element"].get("StoreStockItemList", [])
-
-def get_7_11_store_detail(token, lat, lon, store_no):
-    url = f"{API_7_11_BASE}/Search/FrontendStoreItemStock/GetStoreDetail?token={token}"
-    headers = {
-        "user-agent": USER_AGENT_7_11,
-        "content-type": "application/json",
-    }
-    body = {
-        "CurrentLocation": {"Latitude": lat, "Longitude": lon},
-        "StoreNo": store_no
-    }
-    resp = requests.post(url, headers=headers, json=body)
-    resp.raise_for_status()
-    js = resp.json()
-    if not js.get("isSuccess"):
-        raise RuntimeError(f"取得 7-11 門市({store_no})資料失敗: {js}")
-    return js["element"].get("StoreStockItem", {})
-
-def get_family_nearby_stores(lat, lon):
-    headers = {"Content-Type": "application/json;charset=utf-8"}
-    body = {
-        "ProjectCode": FAMILY_PROJECT_CODE,
-        "latitude": lat,
-        "longitude": lon
-    }
-    resp = requests.post(API_FAMILY, headers=headers, json=body)
-    resp.raise_for_status()
-    js = resp.json()
-    if js.get("code") != 1:
-        raise RuntimeError(f"取得全家門市資料失敗: {js}")
-    return js["data"]
-
-def filter_results(
-    results,
-    distance_km,
-    store_filter,
-    only_under_1km,
-    only_in_stock,
-    tag_include,
-    tag_exclude,
-    only_favorites,
-    favorites,
-    ignore_only_favorites=False,
-):
-    filtered = results
-    if distance_km:
-        max_distance = float(distance_km) * 1000
-        filtered = [r for r in filtered if r["distance_m"] <= max_distance]
-
-    if store_filter == "只看 7-11":
-        filtered = [r for r in filtered if r["store_type"] == "7-11"]
-    elif store_filter == "只看 全家":
-        filtered = [r for r in filtered if r["store_type"] == "全家"]
-
-    if only_under_1km:
-        filtered = [r for r in filtered if r["distance_m"] <= 1000]
-    if only_in_stock:
-        filtered = [
-            r
-            for r in filtered
-            if r["qty"] > 0 or r.get("data_source") == "7-11-fallback"
-        ]
-
-    favorites_set = set(favorites or [])
-    if only_favorites and not ignore_only_favorites:
-        filtered = [r for r in filtered if r.get("store_key") in favorites_set]
-
-    include_set = set(tag_include or [])
-    if include_set:
-        filtered = [
-            r for r in filtered if include_set.intersection(set(r.get("tags", [])))
-        ]
-
-    exclude_set = set(tag_exclude or [])
-    if exclude_set:
-        filtered = [
-            r for r in filtered if not exclude_set.intersection(set(r.get("tags", [])))
-        ]
-
-    filtered.sort(key=lambda x: x["distance_m"])
-    return filtered
-
-
-def apply_filters(
-    results,
-    distance_km,
-    store_filter,
-    only_under_1km,
-    only_in_stock,
-    tag_include,
-    tag_exclude,
-    only_favorites,
-    favorites,
-):
-    if not results:
-        return "", _render_error("❌ 尚未搜尋，請先按下「自動定位並搜尋」")
-
-    filtered = filter_results(
-        results,
-        distance_km,
-        store_filter,
-        only_under_1km,
-        only_in_stock,
-        tag_include,
-        tag_exclude,
-        only_favorites,
-        favorites,
-    )
-
-    if not filtered:
-        return "", _render_error("❌ 沒有符合篩選條件的結果")
-
-    store_keys = {(r["store_type"], r["store_id"]) for r in filtered}
-    total_qty = sum(r["qty"] for r in filtered if r["qty"] > 0)
-    min_distance = min(r["distance_m"] for r in filtered) if filtered else None
-    summary_html = _render_summary(len(store_keys), total_qty, min_distance, filtered)
-    table_html = _render_table(filtered)
-
-    return summary_html, table_html
+distance_searches = SessionSearches("distance")
 
 
 def render_results_panel(
@@ -260,19 +52,14 @@ def render_results_panel(
     tag_exclude,
     only_favorites,
     favorites,
+    page=0,
 ):
-    summary_html, table_html = apply_filters(
-        results,
-        distance_km,
-        store_filter,
-        only_under_1km,
-        only_in_stock,
-        tag_include,
-        tag_exclude,
-        only_favorites,
-        favorites,
-    )
-    favorite_source_rows = filter_results(
+    """
+    只篩選一次：先取得忽略「只看愛店」的結果供愛店清單使用，
+    需要時再從中取出愛店商品列產生摘要與表格。
+    摘要反映完整篩選結果，表格只輸出第 page 頁。
+    """
+    scoped = filter_results(
         results,
         distance_km,
         store_filter,
@@ -284,172 +71,18 @@ def render_results_panel(
         favorites,
         ignore_only_favorites=True,
     )
-    favorites_update = build_favorite_choices(favorite_source_rows, favorites)
-    return summary_html, table_html, favorites_update
-
-def build_store_label(store_type, store_name):
-    safe_name = html.escape(store_name)
-    badge_class = "badge-711" if store_type == "7-11" else "badge-family"
-    badge_text = "7-11" if store_type == "7-11" else "全家"
-    return f"<span class='badge {badge_class}'>{badge_text}</span> {safe_name}"
-
-
-def build_result_row(
-    store_type,
-    store_id,
-    store_name,
-    distance_m,
-    item_label,
-    qty,
-    tags,
-    data_source,
-    address="",
-):
-    return {
-        "store_type": store_type,
-        "store_id": store_id,
-        "store_key": build_store_key(store_type, store_id),
-        "store_name": store_name,
-        "store_label": build_store_label(store_type, store_name),
-        "distance_m": distance_m,
-        "item_label": item_label,
-        "qty": qty,
-        "tags": tags,
-        "data_source": data_source,
-        "address": address or "",
-    }
-
-
-def get_7_11_fallback_rows(lat, lon, max_distance_km=None):
-    rows = []
-    max_distance_m = float(max_distance_km) * 1000 if max_distance_km else None
-    for store in load_7_11_fallback_stores():
-        distance_m = haversine_meters(lat, lon, store["lat"], store["lng"])
-        if max_distance_m is not None and distance_m > max_distance_m:
-            continue
-        rows.append(
-            build_result_row(
-                "7-11",
-                str(store["id"]),
-                store["name"],
-                distance_m,
-                "靜態門市資料（未提供即期品）",
-                0,
-                [],
-                "7-11-fallback",
-                address=store.get("address", ""),
-            )
-        )
-    return rows
-
-
-def fetch_nearby_stores_data(lat, lon, distance_km=None):
-    results = []
-    max_distance_m = float(distance_km) * 1000 if distance_km else None
-    # ------------------ 7-11 ------------------
-    try:
-        token_711 = get_7_11_token()
-        nearby_stores_711 = get_7_11_nearby_stores(token_711, lat, lon)
-        for store in nearby_stores_711:
-            dist_m = store.get("Distance", 999999)
-            store_no = store.get("StoreNo")
-            store_name = store.get("StoreName", "7-11 未提供店名")
-            remaining_qty = store.get("RemainingQty", 0)
-            if remaining_qty > 0:
-                detail = get_7_11_store_detail(token_711, lat, lon, store_no)
-                for cat in detail.get("CategoryStockItems", []):
-                    cat_name = cat.get("Name", "")
-                    for item in cat.get("ItemList", []):
-                        item_name = item.get("ItemName", "")
-                        item_qty = item.get("RemainingQty", 0)
-                        tags = categorize_tags(f"{cat_name} {item_name}")
-                        results.append(
-                            build_result_row(
-                                "7-11",
-                                store_no,
-                                store_name,
-                                dist_m,
-                                f"{cat_name} - {item_name}",
-                                item_qty,
-                                tags,
-                                "7-11-live",
-                            )
-                        )
-            else:
-                results.append(
-                    build_result_row(
-                        "7-11",
-                        store_no,
-                        store_name,
-                        dist_m,
-                        "即期品 0 項",
-                        0,
-                        [],
-                        "7-11-live",
-                    )
-                )
-    except Exception as e:
-        print(f"❌ 取得 7-11 即期品時發生錯誤: {e}")
-        results.extend(get_7_11_fallback_rows(lat, lon, distance_km))
-
-    # ------------------ FamilyMart ------------------
-    try:
-        nearby_stores_family = get_family_nearby_stores(lat, lon)
-        for store in nearby_stores_family:
-            dist_m = store.get("distance", 999999)
-            store_name = store.get("name", "全家 未提供店名")
-            info_list = store.get("info", [])
-            store_id = (
-                store.get("id")
-                or store.get("storeid")
-                or store.get("posCode")
-                or store_name
-            )
-            has_item = False
-            for big_cat in info_list:
-                big_cat_name = big_cat.get("name", "")
-                for subcat in big_cat.get("categories", []):
-                    subcat_name = subcat.get("name", "")
-                    for product in subcat.get("products", []):
-                        product_name = product.get("name", "")
-                        qty = product.get("qty", 0)
-                        if qty > 0:
-                            has_item = True
-                            tags = categorize_tags(
-                                f"{big_cat_name} {subcat_name} {product_name}"
-                            )
-                            results.append(
-                                build_result_row(
-                                    "全家",
-                                    store_id,
-                                    store_name,
-                                    dist_m,
-                                    f"{big_cat_name} - {subcat_name} - {product_name}",
-                                    qty,
-                                    tags,
-                                    "family-live",
-                                )
-                            )
-            if not has_item:
-                results.append(
-                    build_result_row(
-                        "全家",
-                        store_id,
-                        store_name,
-                        dist_m,
-                        "即期品 0 項",
-                        0,
-                        [],
-                        "family-live",
-                    )
-                )
-    except Exception as e:
-        print(f"❌ 取得全家 即期品時發生錯誤: {e}")
+    # 前端篩選模式下篩選變動不會回到伺服器，愛店選項改列出目前結果的全部門市
+    favorite_scope = (
+        ResultView(scoped.results, range(len(scoped.results))) if CLIENT_SIDE_FILTERING else scoped
+    )
+    favorites_update = build_favorite_choices(favorite_scope, favorites)
+    if not results:
+        return "", render_error("❌ 尚未搜尋，請先按下「自動定位並搜尋」"), favorites_update
 
-    if max_distance_m is not None:
-        results = [r for r in results if r["distance_m"] <= max_distance_m]
+    visible = restrict_to_favorites(scoped, favorites) if only_favorites else scoped
+    summary_html, table_html = render_filtered_view(visible, page)
+    return summary_html, table_html, favorites_update
 
-    return results
 
 def find_nearest_store(
     address,
@@ -466,6 +99,7 @@ def find_nearest_store(
     input_mode,
 ):
     """
+    以 generator 逐步更新畫面：先顯示附近門市清單，再隨各門市明細與全家結果到達補上商品。
     distance_km: 選擇的公里數
     store_filter: '全部' / '只看 7-11' / '只看 全家'
     only_under_1km: bool，是否只顯示 1km 以內
@@ -481,50 +115,41 @@ def find_nearest_store(
     # 若有填地址且 lat/lon 為 0，嘗試用 Google Geocoding API
     if address and address.strip() != "" and (lat == 0 or lon == 0):
         try:
-            googlekey = os.environ.get("googlekey")
-            if not googlekey:
-                raise RuntimeError("未設定 googlekey，請於 Huggingface Space Secrets 設定。")
-            geocode_url = "https://maps.googleapis.com/maps/api/geocode/json"
-            params = {
-                "address": address,
-                "key": googlekey
-            }
-            resp = requests.get(geocode_url, params=params)
-            resp.raise_for_status()
-            data = resp.json()
-            if data.get("status") == "OK" and data.get("results"):
-                location = data["results"][0]["geometry"]["location"]
-                lat = float(location["lat"])
-                lon = float(location["lng"])
-                print(f"地址轉換成功: {address} => lat={lat}, lon={lon}")
-            else:
-                print(f"❌ Google Geocoding 失敗: {data}")
-                return "", _render_error("❌ 地址轉換失敗，請輸入正確地址"), lat, lon, [], gr.update(), 0
+            lat, lon = geocode_address(address)
         except Exception as e:
             print(f"❌ Google Geocoding 失敗: {e}")
-            return "", _render_error("❌ 地址轉換失敗，請輸入正確地址"), lat, lon, [], gr.update(), 0
+            yield "", render_error("❌ 地址轉換失敗，請輸入正確地址"), lat, lon, [], gr.update(), 0, []
+            return
 
     if lat == 0 or lon == 0:
-        return "", _render_error("❌ 請輸入地址或提供 GPS 座標"), lat, lon, [], gr.update(), 0
-
-    results = fetch_nearby_stores_data(lat, lon, distance_km)
-
-    if not results:
-        return "", _render_error("❌ 附近沒有可顯示的門市或即期品"), lat, lon, [], gr.update(), distance_km
-
-    summary_html, table_html, favorites_update = render_results_panel(
-        results,
-        distance_km,
-        store_filter,
-        only_under_1km,
-        only_in_stock,
-        tag_include,
-        tag_exclude,
-        only_favorites,
-        favorites,
-    )
+        yield "", render_error("❌ 請輸入地址或提供 GPS 座標"), lat, lon, [], gr.update(), 0, []
+        return
+
+    # 只查詢目前品牌篩選需要的來源，其他品牌等使用者切換時再補抓
+    providers = providers_for_filter(store_filter)
+    for results, done in stream_nearby_stores(lat, lon, distance_km, providers):
+        if not results:
+            if done:
+                yield "", render_error("❌ 附近沒有可顯示的門市或即期品"), lat, lon, [], gr.update(), distance_km, providers
+            continue
 
-    return summary_html, table_html, lat, lon, results, favorites_update, distance_km
+        summary_html, table_html, favorites_update = render_results_panel(
+            results,
+            distance_km,
+            store_filter,
+            only_under_1km,
+            only_in_stock,
+            tag_include,
+            tag_exclude,
+            only_favorites,
+            favorites,
+        )
+        if not done:
+            summary_html = (
+                "<div class='callout callout-info'>⏳ 仍在載入其他門市明細與品牌資料，結果會陸續更新…</div>"
+                + summary_html
+            )
+        yield summary_html, table_html, lat, lon, results, favorites_update, distance_km, providers
 
 
 def handle_distance_change(
@@ -532,6 +157,7 @@ def handle_distance_change(
     lon,
     distance_km,
     fetched_radius_km,
+    fetched_providers,
     store_filter,
     only_under_1km,
     only_in_stock,
@@ -540,11 +166,23 @@ def handle_distance_change(
     only_favorites,
     favorites,
     results,
+    results_origin=None,
 ):
+    """
+    results_origin 為 results 查詢時的 (lat, lon)；座標欄位可編輯，
+    與目前座標不同時既有結果不再沿用，改以目前座標重新查詢。
+    """
     if not results:
-        return "", _render_error("❌ 尚未搜尋，請先按下「自動定位並搜尋」"), results, gr.update(), fetched_radius_km
+        return "", render_error("❌ 尚未搜尋，請先按下「自動定位並搜尋」"), results, gr.update(), fetched_radius_km, fetched_providers
 
-    if fetched_radius_km and float(distance_km) <= float(fetched_radius_km):
+    # lat/lon 欄位可被清空（None），先確認座標再與結果的查詢座標比較
+    if not lat or not lon:
+        return "", render_error("❌ 缺少目前搜尋座標，請重新搜尋"), results, gr.update(), fetched_radius_km, fetched_providers
+
+    same_origin = results_origin is None or (
+        float(results_origin[0]) == float(lat) and float(results_origin[1]) == float(lon)
+    )
+    if same_origin and fetched_radius_km and float(distance_km) <= float(fetched_radius_km):
         summary_html, table_html, favorites_update = render_results_panel(
             results,
             distance_km,
@@ -556,14 +194,14 @@ def handle_distance_change(
             only_favorites,
             favorites,
         )
-        return summary_html, table_html, results, favorites_update, fetched_radius_km
-
-    if lat == 0 or lon == 0:
-        return "", _render_error("❌ 缺少目前搜尋座標，請重新搜尋"), results, gr.update(), fetched_radius_km
+        return summary_html, table_html, results, favorites_update, fetched_radius_km, fetched_providers
 
-    fresh_results = fetch_nearby_stores_data(lat, lon, distance_km)
+    # 既有結果已涵蓋同一座標的較小半徑，只補抓新進入範圍的門市
+    providers = providers_for_filter(store_filter)
+    known = results if same_origin else None
+    fresh_results = fetch_nearby_stores_data(lat, lon, distance_km, providers, known=known)
     if not fresh_results:
-        return "", _render_error("❌ 擴大搜尋範圍後仍沒有可顯示的門市或即期品"), [], gr.update(), distance_km
+        return "", render_error("❌ 擴大搜尋範圍後仍沒有可顯示的門市或即期品"), [], gr.update(), distance_km, providers
 
     summary_html, table_html, favorites_update = render_results_panel(
         fresh_results,
@@ -576,94 +214,56 @@ def handle_distance_change(
         only_favorites,
         favorites,
     )
-    return summary_html, table_html, fresh_results, favorites_update, distance_km
-
-def _render_error(msg: str):
-    safe_msg = html.escape(msg)
-    return f"<div class='callout callout-error'>{safe_msg}</div>"
-
-def _render_summary(store_count: int, total_qty: int, min_distance: Optional[float], rows):
-    nearest = f"{min_distance:.1f} m" if min_distance is not None else "—"
-    tag_counts = {k: 0 for k in TAG_ICONS.keys()}
-    for r in rows:
-        for tag in r.get("tags", []):
-            if tag in tag_counts:
-                tag_counts[tag] += 1
-    tags_html = "".join(
-        f"<span class='tag-chip tag-{k}'>{TAG_ICONS.get(k, '')} {k} {v}</span>"
-        for k, v in tag_counts.items()
-        if v > 0
-    )
-    notices = []
-    if any(r.get("data_source") == "7-11-fallback" for r in rows):
-        notices.append(
-            "<div class='callout callout-info'>7-11 即期品 API 暫時不可用，以下改顯示附近 7-11 靜態門市資料與地址。</div>"
-        )
-    return f"""
-    {''.join(notices)}
-    <div class='summary-bar'>
-        <div><span class='summary-label'>門市</span><span class='summary-value'>{store_count}</span></div>
-        <div><span class='summary-label'>可售商品數</span><span class='summary-value'>{total_qty}</span></div>
-        <div><span class='summary-label'>最近距離</span><span class='summary-value'>{nearest}</span></div>
-        <div><span class='summary-label'>品項分類</span><span class='summary-value tags'>{tags_html or '—'}</span></div>
-    </div>
-    """
+    return summary_html, table_html, fresh_results, favorites_update, distance_km, providers
 
-def _render_table(rows):
-    body_html = []
-    for r in rows:
-        qty_class = "qty-zero" if r["qty"] <= 0 else ""
-        tags = r.get("tags", [])
-        tag_class = ""
-        if "麵" in tags:
-            tag_class = "cat-noodle"
-        elif "湯" in tags:
-            tag_class = "cat-soup"
-        elif "飯糰" in tags:
-            tag_class = "cat-riceball"
-        elif "飯" in tags:
-            tag_class = "cat-rice"
-
-        tag_html = "".join(
-            f"<span class='tag-pill tag-{tag}'>{TAG_ICONS.get(tag, '')} {tag}</span>"
-            for tag in tags
-        )
-        item_cell = f"{tag_html}{html.escape(r['item_label'])}"
-        address_html = (
-            f"<div class='store-address'>{html.escape(r['address'])}</div>"
-            if r.get("address")
-            else ""
-        )
-        body_html.append(
-            f"""
-            <tr class='{qty_class} {tag_class}'>
-                <td>{r["store_label"]}{address_html}</td>
-                <td>{r["distance_m"]:.1f} m</td>
-                <td>{item_cell}</td>
-                <td class='qty-cell'>{r["qty"]}</td>
-            </tr>
-            """
-        )
-    return f"""
-    <div class='table-wrap'>
-        <table class='results-table'>
-            <thead>
-                <tr>
-                    <th>門市</th>
-                    <th>距離 (m)</th>
-                    <th>商品 / 即期食品</th>
-                    <th>數量</th>
-                </tr>
-            </thead>
-            <tbody>
-                {''.join(body_html)}
-            </tbody>
-        </table>
-    </div>
+
+def missing_providers(store_filter, fetched_providers):
+    """品牌篩選需要、但目前結果尚未查詢過的資料來源。"""
+    return [p for p in providers_for_filter(store_filter) if p not in (fetched_providers or [])]
+
+
+def handle_store_filter_change(
+    lat,
+    lon,
+    fetched_radius_km,
+    fetched_providers,
+    distance_km,
+    store_filter,
+    only_under_1km,
+    only_in_stock,
+    tag_include,
+    tag_exclude,
+    only_favorites,
+    favorites,
+    results,
+):
+    """
+    品牌篩選放寬（例如從「只看 7-11」切回「全部」）時，
+    只補抓尚未查詢過的品牌並併入目前結果，其餘情況僅在本地篩選。
     """
+    fetched_providers = list(fetched_providers or [])
+    missing = missing_providers(store_filter, fetched_providers)
+    if results and missing and lat and lon:
+        extra_rows = fetch_nearby_stores_data(lat, lon, fetched_radius_km, missing)
+        results = ResultSet().extend(results).extend(extra_rows).sorted_by_distance().render_cells()
+        fetched_providers = fetched_providers + missing
+
+    summary_html, table_html, favorites_update = render_results_panel(
+        results,
+        distance_km,
+        store_filter,
+        only_under_1km,
+        only_in_stock,
+        tag_include,
+        tag_exclude,
+        only_favorites,
+        favorites,
+    )
+    return summary_html, table_html, favorites_update, results, fetched_providers
 
 # ========== Gradio 介面 ==========
 
+
 def main():
     with gr.Blocks(
         title="便利商店即期食品查詢",
@@ -713,7 +313,7 @@ def main():
             .qty-cell { text-align: right; font-variant-numeric: tabular-nums; }
             .callout { padding: 12px 14px; border-radius: 10px; border: 1px solid #f0b8b8; background: #fff3f3; color: #a12b2b; }
             .callout-info { margin-bottom: 12px; border-color: #c8dcff; background: #f4f8ff; color: #214f9a; }
-            .tag-chip { display: inline-block; padding: 2px 8px; border-radius: 999px; margin-right: 6px; font-size: 12px; }
+            .tag-chip { display: inline-block; padding: 2px 8px; border-radius: 999px; margin-right: 6px; font-size: 12px; background: #f1f1f1; }
             .tag-麵 { background: #ffe2e8; color: #b0233e; }
             .tag-湯 { background: #e8f1ff; color: #2b4ba1; }
             .tag-飯 { background: #fff1d6; color: #b46500; }
@@ -722,12 +322,13 @@ def main():
             .cat-soup td { background: #f4f8ff; }
             .cat-rice td { background: #fff9f0; }
             .cat-riceball td { background: #f4fff4; }
-            .tag-pill { display: inline-flex; align-items: center; gap: 4px; padding: 2px 6px; border-radius: 8px; font-size: 12px; margin-right: 6px; }
+            .tag-pill { display: inline-flex; align-items: center; gap: 4px; padding: 2px 6px; border-radius: 8px; font-size: 12px; margin-right: 6px; background: #f1f1f1; }
             .tag-pill.tag-麵 { background: #ffe2e8; color: #b0233e; }
             .tag-pill.tag-湯 { background: #e8f1ff; color: #2b4ba1; }
             .tag-pill.tag-飯 { background: #fff1d6; color: #b46500; }
             .tag-pill.tag-飯糰 { background: #e8ffe8; color: #2b7a3d; }
             .store-address { margin-top: 4px; font-size: 12px; color: #666; }
+            .pager-info { margin-top: 6px; font-size: 12px; color: #666; text-align: right; }
             </style>
             """
         )
@@ -764,7 +365,7 @@ def main():
             distance_slider = gr.Slider(
                 label="搜尋範圍 (公里)",
                 minimum=1,
-                maximum=21,
+                maximum=MAX_SEARCH_RADIUS_KM,
                 step=1,
                 value=3,
                 interactive=True,
@@ -806,9 +407,27 @@ def main():
 
         summary_html = gr.HTML("")
         results_html = gr.HTML("")
+        with gr.Row():
+            prev_page_button = gr.Button("◀ 上一頁", size="sm")
+            next_page_button = gr.Button("下一頁 ▶", size="sm")
         results_state = gr.State([])
         favorites_state = gr.State([])
         fetched_radius_state = gr.State(0)
+        fetched_providers_state = gr.State([])
+        page_state = gr.State(0)
+        # 前端篩選模式：搜尋結果的精簡 JSON 與目前頁碼放在隱藏元件，供瀏覽器端篩選讀取
+        client_payload = gr.Textbox(value="", visible="hidden")
+        client_page = gr.Number(value=0, visible="hidden")
+        client_outputs = [client_payload, client_page] if CLIENT_SIDE_FILTERING else []
+
+        def with_client_payload(outputs, results):
+            if not CLIENT_SIDE_FILTERING:
+                return outputs
+            payload = results.to_client_payload() if isinstance(results, ResultSet) and results else ""
+            return (*outputs, payload, 0)
+
+        def on_distance_release(distance_km, request: gr.Request):
+            distance_searches.supersede(request.session_hash if request else None, distance_km)
 
         def on_mode_change(mode):
             return (
@@ -816,6 +435,25 @@ def main():
                 gr.update(visible=mode == "用 GPS"),
             )
 
+        def session_id_of(request):
+            return request.session_hash if request else None
+
+        # results_state 只保存 ResultHandle，結果集本身由 session_results 管理；
+        # 已被淘汰的結果回傳 None，各事件提示重新搜尋，不在篩選或換頁時重新查詢
+        def load_results(handle):
+            return session_results.get(handle) if isinstance(handle, ResultHandle) else []
+
+        def render_expired():
+            return render_error("⌛ 搜尋結果已過期，請重新按下「自動定位並搜尋」")
+
+        def save_results(request, results, lat, lon, radius_km, providers):
+            if not isinstance(results, ResultSet) or not results:
+                return []
+            return session_results.put(session_id_of(request), results, lat, lon, radius_km, providers)
+
+        def on_unload(request: gr.Request):
+            session_results.discard(session_id_of(request))
+
         def on_favorites_change(
             favorites,
             results,
@@ -827,8 +465,12 @@ def main():
             tag_exclude,
             only_favorites,
         ):
+            current = load_results(results)
+            if current is None:
+                outputs = (favorites, "", render_expired(), gr.update(), 0)
+                return (*outputs, 0) if CLIENT_SIDE_FILTERING else outputs
             summary_html, table_html, favorites_update = render_results_panel(
-                results,
+                current,
                 distance_km,
                 store_filter,
                 only_under_1km,
@@ -838,7 +480,8 @@ def main():
                 only_favorites,
                 favorites,
             )
-            return favorites, summary_html, table_html, favorites_update
+            outputs = (favorites, summary_html, table_html, favorites_update, 0)
+            return (*outputs, 0) if CLIENT_SIDE_FILTERING else outputs
 
         def on_local_filter_change(
             results,
@@ -851,8 +494,11 @@ def main():
             only_favorites,
             favorites,
         ):
-            return render_results_panel(
-                results,
+            current = load_results(results)
+            if current is None:
+                return "", render_expired(), gr.update(), 0
+            summary_html, table_html, favorites_update = render_results_panel(
+                current,
                 distance_km,
                 store_filter,
                 only_under_1km,
@@ -862,6 +508,65 @@ def main():
                 only_favorites,
                 favorites,
             )
+            return summary_html, table_html, favorites_update, 0
+
+        def on_page_change(delta):
+            def handler(
+                page,
+                results,
+                distance_km,
+                store_filter,
+                only_under_1km,
+                only_in_stock,
+                tag_include,
+                tag_exclude,
+                only_favorites,
+                favorites,
+            ):
+                current = load_results(results)
+                if current is None:
+                    return render_expired(), 0
+                return render_results_page(
+                    current,
+                    (page or 0) + delta,
+                    distance_km,
+                    store_filter,
+                    only_under_1km,
+                    only_in_stock,
+                    tag_include,
+                    tag_exclude,
+                    only_favorites,
+                    favorites,
+                )
+
+            return handler
+
+        # 新搜尋或篩選變動後結果表格回到第一頁
+        def on_search(request: gr.Request, *args):
+            for outputs in find_nearest_store(*args):
+                summary, table, lat, lon, results, favorites_update, radius_km, providers = outputs
+                handle = save_results(request, results, lat, lon, radius_km, providers)
+                outputs = (summary, table, lat, lon, handle, favorites_update, radius_km, providers, 0)
+                yield with_client_payload(outputs, results)
+
+        def on_store_filter_change(request: gr.Request, *args):
+            *inputs, handle = args
+            current = load_results(handle)
+            lat, lon, radius_km, fetched_providers, _, store_filter = inputs[:6]
+            # 已過期（None）也算搜尋過：需要補抓品牌時改為提示重新搜尋
+            searched = current is None or bool(current)
+            needs_fetch = searched and lat and lon and missing_providers(store_filter, fetched_providers)
+            if CLIENT_SIDE_FILTERING and not needs_fetch:
+                # 不需補抓品牌時篩選已由瀏覽器端完成，不重送面板與結果 JSON，避免與前端篩選互相覆蓋
+                return tuple(gr.skip() for _ in range(6 + len(client_outputs)))
+            if current is None:
+                outputs = ("", render_expired(), gr.update(), handle, fetched_providers, 0)
+                return (*outputs, *(gr.skip() for _ in client_outputs))
+            summary, table, favorites_update, results, providers = handle_store_filter_change(*inputs, current)
+            if results is not current:
+                handle = save_results(request, results, lat, lon, radius_km, providers)
+            outputs = (summary, table, favorites_update, handle, providers, 0)
+            return with_client_payload(outputs, results)
 
         def on_distance_change(
             address,
@@ -869,6 +574,7 @@ def main():
             lon,
             distance_km,
             fetched_radius_km,
+            fetched_providers,
             store_filter,
             only_under_1km,
             only_in_stock,
@@ -878,21 +584,47 @@ def main():
             favorites,
             results,
             input_mode,
+            request: gr.Request,
         ):
-            return handle_distance_change(
-                lat,
-                lon,
-                distance_km,
-                fetched_radius_km,
-                store_filter,
-                only_under_1km,
-                only_in_stock,
-                tag_include,
-                tag_exclude,
-                only_favorites,
-                favorites,
-                results,
-            )
+            # 同一 session 只保留最新的距離搜尋，被取代的搜尋略過剩餘上游呼叫且不覆蓋畫面
+            session_id = request.session_hash if request else None
+            current = load_results(results)
+            if current is None:
+                outputs = ("", render_expired(), results, gr.update(), fetched_radius_km, fetched_providers, 0)
+                return (*outputs, *(gr.skip() for _ in client_outputs))
+            token = distance_searches.begin(session_id, distance_km)
+            try:
+                outputs = with_cancel_token(
+                    token,
+                    handle_distance_change,
+                    lat,
+                    lon,
+                    distance_km,
+                    fetched_radius_km,
+                    fetched_providers,
+                    store_filter,
+                    only_under_1km,
+                    only_in_stock,
+                    tag_include,
+                    tag_exclude,
+                    only_favorites,
+                    favorites,
+                    current,
+                    (results.lat, results.lon) if isinstance(results, ResultHandle) else None,
+                )
+            except SearchCancelled:
+                outputs = None
+            finally:
+                distance_searches.finish(session_id, token)
+            if outputs is None or token.cancelled:
+                print(f"⏭️ 距離 {distance_km} km 的搜尋已被較新的請求取代")
+                return tuple(gr.skip() for _ in distance_outputs)
+            summary, table, fresh_results, favorites_update, radius_km, providers = outputs
+            handle = results
+            if fresh_results is not current:
+                handle = save_results(request, fresh_results, lat, lon, radius_km, providers)
+            outputs = (summary, table, handle, favorites_update, radius_km, providers, 0)
+            return with_client_payload(outputs, fresh_results)
 
         input_mode.change(
             fn=on_mode_change,
@@ -956,7 +688,7 @@ def main():
         )
 
         auto_gps_search_button.click(
-            fn=find_nearest_store,
+            fn=on_search,
             inputs=[
                 address,
                 lat,
@@ -971,7 +703,18 @@ def main():
                 favorites_state,
                 input_mode,
             ],
-            outputs=[summary_html, results_html, lat, lon, results_state, favorites_group, fetched_radius_state],
+            outputs=[
+                summary_html,
+                results_html,
+                lat,
+                lon,
+                results_state,
+                favorites_group,
+                fetched_radius_state,
+                fetched_providers_state,
+                page_state,
+                *client_outputs,
+            ],
             js="""
             (address, lat, lon, distance, storeFilter, under1k, onlyStock, tagInclude, tagExclude, onlyFavorites, favorites, mode) => {
                 const distanceVal = Number(distance) || 0;
@@ -1030,7 +773,24 @@ def main():
             """
         )
 
-        distance_slider.change(
+        # 拖曳滑桿時等放開後才搜尋，且只保留最後一次；放開當下先取消同 session 參數不同的進行中搜尋
+        distance_outputs = [
+            summary_html,
+            results_html,
+            results_state,
+            favorites_group,
+            fetched_radius_state,
+            fetched_providers_state,
+            page_state,
+            *client_outputs,
+        ]
+        distance_slider.release(
+            fn=on_distance_release,
+            inputs=distance_slider,
+            outputs=None,
+            queue=False,
+        )
+        distance_slider.release(
             fn=on_distance_change,
             inputs=[
                 address,
@@ -1038,6 +798,7 @@ def main():
                 lon,
                 distance_slider,
                 fetched_radius_state,
+                fetched_providers_state,
                 store_filter,
                 only_under_1km,
                 only_in_stock,
@@ -1048,33 +809,116 @@ def main():
                 results_state,
                 input_mode,
             ],
-            outputs=[summary_html, results_html, results_state, favorites_group, fetched_radius_state],
+            outputs=distance_outputs,
+            trigger_mode="always_last",
         )
 
-        # 篩選器變動時只套用快取結果（不重新查詢）
-        for ctrl in (
+        # 品牌篩選放寬時只補抓尚未查詢的品牌，其餘情況與其他篩選器相同
+        store_filter.change(
+            fn=on_store_filter_change,
+            inputs=[
+                lat,
+                lon,
+                fetched_radius_state,
+                fetched_providers_state,
+                distance_slider,
+                store_filter,
+                only_under_1km,
+                only_in_stock,
+                tag_include,
+                tag_exclude,
+                only_favorites,
+                favorites_state,
+                results_state,
+            ],
+            outputs=[
+                summary_html,
+                results_html,
+                favorites_group,
+                results_state,
+                fetched_providers_state,
+                page_state,
+                *client_outputs,
+            ],
+        )
+
+        client_filter_inputs = [
+            client_payload,
+            distance_slider,
             store_filter,
             only_under_1km,
             only_in_stock,
             tag_include,
             tag_exclude,
             only_favorites,
-        ):
-            ctrl.change(
-                fn=on_local_filter_change,
-                inputs=[
-                    results_state,
-                    distance_slider,
-                    store_filter,
-                    only_under_1km,
-                    only_in_stock,
-                    tag_include,
-                    tag_exclude,
-                    only_favorites,
-                    favorites_state,
-                ],
-                outputs=[summary_html, results_html, favorites_group],
-            )
+            favorites_group,
+        ]
+        local_filters = (
+            only_under_1km,
+            only_in_stock,
+            tag_include,
+            tag_exclude,
+            only_favorites,
+        )
+        if CLIENT_SIDE_FILTERING:
+            # 篩選與換頁完全在瀏覽器執行（fn=None），不佔用伺服器佇列；
+            # 品牌篩選另外保留上方的伺服器事件，以便補抓尚未查詢的品牌
+            for ctrl in (store_filter, *local_filters):
+                ctrl.change(
+                    fn=None,
+                    inputs=client_filter_inputs,
+                    outputs=[summary_html, results_html, client_page],
+                    js=f"(...args) => ({CLIENT_FILTER_JS})(...args, 0)",
+                )
+
+            for button, delta in ((prev_page_button, -1), (next_page_button, 1)):
+                button.click(
+                    fn=None,
+                    inputs=[*client_filter_inputs, client_page],
+                    outputs=[summary_html, results_html, client_page],
+                    js=f"""
+                    (...args) => {{
+                        const page = Number(args.pop()) || 0;
+                        return ({CLIENT_FILTER_JS})(...args, page + ({delta}));
+                    }}
+                    """,
+                )
+        else:
+            # 篩選器變動時只套用快取結果（不重新查詢）
+            for ctrl in local_filters:
+                ctrl.change(
+                    fn=on_local_filter_change,
+                    inputs=[
+                        results_state,
+                        distance_slider,
+                        store_filter,
+                        only_under_1km,
+                        only_in_stock,
+                        tag_include,
+                        tag_exclude,
+                        only_favorites,
+                        favorites_state,
+                    ],
+                    outputs=[summary_html, results_html, favorites_group, page_state],
+                )
+
+            for button, delta in ((prev_page_button, -1), (next_page_button, 1)):
+                button.click(
+                    fn=on_page_change(delta),
+                    inputs=[
+                        page_state,
+                        results_state,
+                        distance_slider,
+                        store_filter,
+                        only_under_1km,
+                        only_in_stock,
+                        tag_include,
+                        tag_exclude,
+                        only_favorites,
+                        favorites_state,
+                    ],
+                    outputs=[results_html, page_state],
+                )
 
         favorites_group.change(
             fn=on_favorites_change,
@@ -1089,7 +933,14 @@ def main():
                 tag_exclude,
                 only_favorites,
             ],
-            outputs=[favorites_state, summary_html, results_html, favorites_group],
+            outputs=[
+                favorites_state,
+                summary_html,
+                results_html,
+                favorites_group,
+                page_state,
+                *client_outputs[1:],
+            ],
             js="""
             (favorites, results, distance, storeFilter, under1k, onlyStock, tagInclude, tagExclude, onlyFavorites) => {
                 localStorage.setItem('favorites', JSON.stringify(favorites || []));
@@ -1098,12 +949,25 @@ def main():
             """,
         )
 
+        demo.unload(on_unload)
+        # 執行期狀態：POST /gradio_api/call/stats 或 gradio_client 的 api_name="/stats"
+        gr.api(get_runtime_stats, api_name="stats")
+
+    if not JSON_API_ENABLED:
         demo.launch(
             server_name="0.0.0.0",
             server_port=7860,
             debug=True,
             favicon_path="assets/favicon.svg",
         )
+        return
+
+    # JSON 搜尋端點（/api/search、/api/search/batch）先註冊，Gradio 介面掛在其餘路徑
+    import uvicorn
+    from search_core.http_api import create_app
+
+    api = gr.mount_gradio_app(create_app(), demo, path="/", favicon_path="assets/favicon.svg")
+    uvicorn.run(api, host="0.0.0.0", port=7860)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,100 @@
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from search_core.fallback import load_7_11_fallback_table  # noqa: E402
+from search_core.geo import haversine_matrix, haversine_meters, haversine_meters_vec  # noqa: E402
+
+
+def synthetic_stores(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"{i:06d}",
+            "name": f"門市{i}",
+            "lat": rng.uniform(21.9, 25.3),
+            "lng": rng.uniform(120.0, 122.0),
+        }
+        for i in range(count)
+    ]
+
+
+def load_stores(synthetic_count: int):
+    table = load_7_11_fallback_table()
+    if len(table):
+        stores = [
+            {"id": table.store_id(i), "lat": float(table.lats[i]), "lng": float(table.lngs[i])}
+            for i in range(len(table))
+        ]
+        return stores, "data"
+    return synthetic_stores(synthetic_count), "synthetic"
+
+
+def best_of(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較逐店 haversine 迴圈與 NumPy 向量化距離計算")
+    parser.add_argument("--queries", type=int, default=64, help="批次查詢點數量")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--synthetic", type=int, default=7325, help="無本地資料時產生的門市數")
+    args = parser.parse_args()
+
+    stores, source = load_stores(args.synthetic)
+    lats = np.ascontiguousarray([s["lat"] for s in stores], dtype=np.float64)
+    lons = np.ascontiguousarray([s["lng"] for s in stores], dtype=np.float64)
+    rng = random.Random(11)
+    points = [(rng.uniform(24.9, 25.2), rng.uniform(121.4, 121.7)) for _ in range(args.queries)]
+    lat, lon = points[0]
+
+    def loop_single():
+        return [haversine_meters(lat, lon, s["lat"], s["lng"]) for s in stores]
+
+    def numpy_single():
+        return haversine_meters_vec(lat, lon, lats, lons)
+
+    def loop_batch():
+        return [
+            [haversine_meters(qlat, qlon, s["lat"], s["lng"]) for s in stores]
+            for qlat, qlon in points
+        ]
+
+    def numpy_batch():
+        query_lats, query_lons = zip(*points)
+        return haversine_matrix(query_lats, query_lons, lats, lons)
+
+    max_error = float(np.max(np.abs(np.asarray(loop_single()) - numpy_single())))
+    report = {
+        "store_source": source,
+        "stores": len(stores),
+        "queries": len(points),
+        "single_point_ms": {
+            "python_loop": round(best_of(loop_single, args.repeat), 3),
+            "numpy": round(best_of(numpy_single, args.repeat), 3),
+        },
+        "batch_ms": {
+            "python_loop": round(best_of(loop_batch, args.repeat), 3),
+            "numpy": round(best_of(numpy_batch, args.repeat), 3),
+        },
+        "max_abs_error_m": max_error,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import app  # noqa: E402
+from search_core.filters import apply_filters, filter_results, restrict_to_favorites  # noqa: E402
+from search_core.render import render_table  # noqa: E402
+from search_core.results import ResultSet  # noqa: E402
+from search_core.tags import categorize_tags  # noqa: E402
+
+
+ITEM_NAMES = ["雞肉飯", "牛肉麵", "味噌湯", "鮭魚飯糰", "火腿三明治", "鍋燒烏龍湯麵", "咖哩飯", "蔬菜沙拉"]
+
+
+def synthetic_results(row_count: int, items_per_store: int = 10, seed: int = 13):
+    rng = random.Random(seed)
+    results = ResultSet()
+    for store_no in range((row_count + items_per_store - 1) // items_per_store):
+        store_type = "7-11" if store_no % 2 else "全家"
+        source = "7-11-live" if store_type == "7-11" else "family-live"
+        store_idx = results.add_store(
+            store_type, f"{store_no:06d}", f"測試門市{store_no}", rng.uniform(0, 21000), source
+        )
+        for _ in range(items_per_store):
+            if len(results) >= row_count:
+                break
+            label = rng.choice(ITEM_NAMES)
+            results.add_item(store_idx, label, rng.randint(0, 3), categorize_tags(label))
+    return results.sorted_by_distance()
+
+
+def render_two_pass(results, filters):
+    # 舊流程：apply_filters 篩選一次，愛店清單再以 ignore_only_favorites 篩選一次
+    summary_html, table_html = apply_filters(results, *filters)
+    favorite_rows = filter_results(results, *filters, ignore_only_favorites=True)
+    return summary_html, table_html, app.build_favorite_choices(favorite_rows, filters[-1])
+
+
+def render_table_cold(view):
+    # 清空欄位快取，模擬每次重新產生整頁 HTML 的舊流程
+    view.results.store_cells[:] = [None] * view.results.store_count
+    view.results.item_cells[:] = [None] * len(view.results)
+    return render_table(view, 0, len(view))
+
+
+def best_of(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較 render_results_panel 單次篩選與舊的兩次篩選流程，以及欄位 HTML 快取的表格產生成本")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = synthetic_results(args.rows)
+    favorites = [results.store_keys[j] for j in range(0, results.store_count, 7)]
+    scenarios = {
+        "all_rows": (21, "全部", False, False, [], [], False, favorites),
+        "in_stock_tags": (21, "全部", False, True, ["麵", "飯"], ["湯"], False, favorites),
+        "only_favorites": (21, "全部", False, True, [], [], True, favorites),
+    }
+
+    report = {"rows": len(results), "stores": results.store_count, "scenarios": {}}
+    for name, filters in scenarios.items():
+        assert render_two_pass(results, filters)[:2] == app.render_results_panel(results, *filters)[:2]
+        # 只計篩選成本：排除兩條路徑共同的 HTML 組裝
+        filter_two_pass = best_of(
+            lambda: (
+                filter_results(results, *filters),
+                filter_results(results, *filters, ignore_only_favorites=True),
+            ),
+            args.repeat,
+        )
+        filter_single = best_of(
+            lambda: restrict_to_favorites(
+                filter_results(results, *filters, ignore_only_favorites=True), filters[-1]
+            )
+            if filters[6]
+            else filter_results(results, *filters, ignore_only_favorites=True),
+            args.repeat,
+        )
+        report["scenarios"][name] = {
+            "filter_ms": {"two_pass": round(filter_two_pass, 3), "single_pass": round(filter_single, 3)},
+            "panel_ms": {
+                "two_pass": round(best_of(lambda: render_two_pass(results, filters), args.repeat), 3),
+                "single_pass": round(
+                    best_of(lambda: app.render_results_panel(results, *filters), args.repeat), 3
+                ),
+            },
+        }
+
+    view = filter_results(results, *scenarios["all_rows"], ignore_only_favorites=True)
+    cold_ms = best_of(lambda: render_table_cold(view), args.repeat)
+    results.render_cells()
+    report["table_render_ms"] = {
+        "rows": len(view),
+        "cold": round(cold_ms, 3),
+        "cached_cells": round(best_of(lambda: render_table(view, 0, len(view)), args.repeat), 3),
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
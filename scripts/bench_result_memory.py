@@ -0,0 +1,99 @@
+import argparse
+import json
+import pickle
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from search_core.results import ResultSet, build_result_row  # noqa: E402
+from search_core.tags import categorize_tags  # noqa: E402
+
+
+ITEM_NAMES = ["雞肉飯", "牛肉麵", "味噌湯", "鮭魚飯糰", "火腿三明治", "鍋燒烏龍湯麵", "咖哩飯", "蔬菜沙拉"]
+
+
+def synthetic_stores(store_count: int, items_per_store: int, seed: int = 5):
+    rng = random.Random(seed)
+    stores = []
+    for i in range(store_count):
+        store_type = "7-11" if i % 2 else "全家"
+        items = [
+            (f"分類{k % 4} - {rng.choice(ITEM_NAMES)}", rng.randint(0, 5))
+            for k in range(items_per_store)
+        ]
+        stores.append((store_type, f"{i:06d}", f"測試門市{i}", rng.uniform(0, 21000), items))
+    return stores
+
+
+def build_dict_rows(stores):
+    rows = []
+    for store_type, store_id, store_name, distance_m, items in stores:
+        for label, qty in items:
+            rows.append(
+                build_result_row(
+                    store_type,
+                    store_id,
+                    store_name,
+                    distance_m,
+                    label,
+                    qty,
+                    categorize_tags(label),
+                    "7-11-live" if store_type == "7-11" else "family-live",
+                )
+            )
+    return rows
+
+
+def build_result_set(stores):
+    results = ResultSet()
+    for store_type, store_id, store_name, distance_m, items in stores:
+        source = "7-11-live" if store_type == "7-11" else "family-live"
+        store_idx = results.add_store(store_type, store_id, store_name, distance_m, source)
+        for label, qty in items:
+            results.add_item(store_idx, label, qty, categorize_tags(label))
+    # 與 app 保存進 session 的結果相同：依距離排序並預先產生門市與商品欄位 HTML
+    return results.sorted_by_distance().render_cells()
+
+
+def measure(builder, stores):
+    tracemalloc.start()
+    started = time.perf_counter()
+    value = builder(stores)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, {
+        "retained_kb": round(current / 1024, 1),
+        "build_ms": round(elapsed_ms, 2),
+        "pickle_kb": round(len(pickle.dumps(value)) / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較 list-of-dicts 與 ResultSet 的記憶體用量")
+    parser.add_argument("--stores", type=int, default=300)
+    parser.add_argument("--items", type=int, default=12, help="每間門市的商品數")
+    args = parser.parse_args()
+
+    stores = synthetic_stores(args.stores, args.items)
+    _, dict_stats = measure(build_dict_rows, stores)
+    result_set, columnar_stats = measure(build_result_set, stores)
+    report = {
+        "stores": args.stores,
+        "items": len(result_set),
+        "list_of_dicts": dict_stats,
+        "result_set": columnar_stats,
+        "retained_ratio": round(columnar_stats["retained_kb"] / dict_stats["retained_kb"], 3),
+        "result_set_approx_kb": round(result_set.approx_bytes() / 1024, 1),
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
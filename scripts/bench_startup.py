@@ -0,0 +1,64 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 每個情境都在新的 Python process 中執行，量測從零開始的 import 成本
+SCENARIOS = {
+    "search_core": "import search_core",
+    "filter_results": "from search_core import filter_results",
+    "fetch_nearby_stores_data": "from search_core import fetch_nearby_stores_data",
+    "fallback_index": "from search_core.fallback import load_7_11_fallback_index",
+    "app": "import app",
+}
+HEAVY_MODULES = ["gradio", "numpy", "requests", "pandas"]
+
+PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started
+print(json.dumps([elapsed, [name for name in {heavy!r} if name in sys.modules]]))
+"""
+
+
+def run_scenario(statement: str):
+    code = PROBE.format(root=str(ROOT), statement=statement, heavy=HEAVY_MODULES)
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    # 匯入過程可能有其他輸出，結果在最後一行
+    elapsed, loaded = json.loads(output.strip().splitlines()[-1])
+    return elapsed, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較只載入搜尋核心與載入完整 Gradio app 的啟動時間")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="+", choices=sorted(SCENARIOS), help="只量測指定情境")
+    args = parser.parse_args()
+
+    report = {}
+    for name in args.only or SCENARIOS:
+        timings = []
+        loaded = []
+        for _ in range(args.repeat):
+            seconds, loaded = run_scenario(SCENARIOS[name])
+            timings.append(seconds * 1000)
+        report[name] = {
+            "statement": SCENARIOS[name],
+            "min_ms": round(min(timings), 1),
+            "median_ms": round(statistics.median(timings), 1),
+            "heavy_modules_loaded": loaded,
+        }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
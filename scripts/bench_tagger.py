@@ -0,0 +1,136 @@
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from search_core.tags import ITEM_TAG_CATEGORIES, KeywordTagger  # noqa: E402
+
+
+SEVEN_ELEVEN_CATEGORIES = ["主食", "麵食", "鮮食", "飯糰", "沙拉", "甜點", "麵包", "飲品"]
+FAMILY_CATEGORIES = [("鮮食", "便當"), ("鮮食", "涼麵"), ("鮮食", "飯糰"), ("烘焙", "麵包"), ("甜點", "蛋糕"), ("飲料", "乳品")]
+PRODUCT_NAMES = [
+    "雞腿便當", "排骨便當", "鮭魚飯糰", "鮪魚飯糰", "肉鬆飯糰", "牛肉麵", "麻醬涼麵", "日式拉麵",
+    "咖哩雞肉飯", "滷肉飯", "親子丼", "味噌湯", "玉米濃湯", "火腿三明治", "總匯三明治", "雞肉捲餅",
+    "凱薩沙拉", "鮮蔬沙拉", "奶油可頌", "原味貝果", "牛奶吐司", "巧克力蛋糕", "焦糖布丁", "草莓大福",
+    "美式咖啡", "鮮奶茶", "無糖綠茶", "柳橙果汁", "皮蛋瘦肉粥", "關東煮", "雞塊", "豬肉水餃",
+    "鮮肉包子", "鮭魚握壽司", "綜合水果切盤", "蛋奶素炒麵", "烤地瓜", "茶葉蛋", "御飯糰組合", "義大利肉醬麵",
+]
+
+
+def synthetic_corpus(count: int, seed: int = 17):
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        product = rng.choice(PRODUCT_NAMES)
+        if i % 2:
+            corpus.append(f"{rng.choice(SEVEN_ELEVEN_CATEGORIES)} {product}")
+        else:
+            big_cat, sub_cat = rng.choice(FAMILY_CATEGORIES)
+            corpus.append(f"{big_cat} {sub_cat} {product}")
+    return corpus
+
+
+def load_corpus(path, count: int):
+    if path:
+        labels = [line.strip() for line in Path(path).read_text(encoding="utf-8").splitlines()]
+        return [label for label in labels if label], str(path)
+    return synthetic_corpus(count), "synthetic"
+
+
+def grow_dictionary(categories, keyword_count: int, seed: int = 23):
+    """在設定的分類之外補上隨機關鍵字，模擬分類字典成長。"""
+    rng = random.Random(seed)
+    alphabet = "".join(sorted({ch for name in PRODUCT_NAMES for ch in name}))
+    grown = [dict(category, keywords=list(category.get("keywords", ()))) for category in categories]
+    current = sum(len(category["keywords"]) for category in grown)
+    while current < keyword_count:
+        category = rng.choice(grown)
+        category["keywords"].append("".join(rng.choice(alphabet) for _ in range(rng.randint(3, 5))))
+        current += 1
+    return grown
+
+
+def naive_mask(categories, text):
+    mask = 0
+    for bit, category in enumerate(categories):
+        if any(keyword in text for keyword in category.get("keywords", ())) and not any(
+            keyword in text for keyword in category.get("exclude", ())
+        ):
+            mask |= 1 << bit
+    return mask
+
+
+def legacy_categorize_tags(text):
+    # 改寫前 categorize_tags 的四條固定規則
+    tags = []
+    if "飯糰" in text:
+        tags.append("飯糰")
+    if "麵" in text:
+        tags.append("麵")
+    if "湯" in text:
+        tags.append("湯")
+    if "飯" in text and "飯糰" not in text:
+        tags.append("飯")
+    return tags
+
+
+def best_of(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較逐一子字串比對與 Aho–Corasick 品項標籤器")
+    parser.add_argument("--items", type=int, default=20000, help="無 --corpus 時產生的商品名稱數")
+    parser.add_argument("--corpus", help="一行一個商品名稱的文字檔")
+    parser.add_argument("--keywords", type=int, nargs="+", default=[100, 500, 2000], help="擴充後的關鍵字總數")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus, source = load_corpus(args.corpus, args.items)
+    per_item_us = lambda seconds: round(seconds / len(corpus) * 1e6, 3)  # noqa: E731
+
+    report = {
+        "corpus_source": source,
+        "items": len(corpus),
+        "legacy_four_rules_us": per_item_us(
+            best_of(lambda: [legacy_categorize_tags(text) for text in corpus], args.repeat)
+        ),
+        "dictionaries": [],
+    }
+    configured = ITEM_TAG_CATEGORIES
+    sizes = [sum(len(category.get("keywords", ())) for category in configured), *args.keywords]
+    for size in sizes:
+        categories = grow_dictionary(configured, size)
+        started = time.perf_counter()
+        tagger = KeywordTagger(categories)
+        build_ms = (time.perf_counter() - started) * 1000
+        assert all(tagger.mask(text) == naive_mask(categories, text) for text in corpus[:2000])
+        report["dictionaries"].append(
+            {
+                "categories": len(categories),
+                "keywords": sum(len(category["keywords"]) for category in categories),
+                "build_ms": round(build_ms, 2),
+                "substring_us": per_item_us(
+                    best_of(lambda: [naive_mask(categories, text) for text in corpus], args.repeat)
+                ),
+                "aho_corasick_us": per_item_us(
+                    best_of(lambda: [tagger.mask(text) for text in corpus], args.repeat)
+                ),
+            }
+        )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
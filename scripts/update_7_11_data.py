@@ -1,5 +1,11 @@
+import argparse
+import hashlib
 import json
+import os
 import re
+import struct
+import sys
+from array import array
 from datetime import datetime, timezone
 from pathlib import Path
 
@@ -7,9 +13,22 @@ import requests
 
 
 ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from search_core.config import SEVEN_ELEVEN_BINARY_MAGIC  # noqa: E402
+from search_core.geo import haversine_meters  # noqa: E402
+
 DATA_DIR = ROOT / "data"
 STORES_PATH = DATA_DIR / "seven_eleven_stores.json"
+STORES_BIN_PATH = DATA_DIR / "seven_eleven_stores.bin"
 METADATA_PATH = DATA_DIR / "seven_eleven_stores_metadata.json"
+# 每次資料有變動時追加一行 JSON：新增、移除、搬遷與其他欄位更新的門市
+CHANGELOG_PATH = DATA_DIR / "seven_eleven_stores_changelog.jsonl"
+# --incremental 使用的上游原始檔快取與 ETag / Last-Modified
+SOURCE_CACHE_DIR = DATA_DIR / "source_cache"
+SOURCE_CACHE_STATE_PATH = SOURCE_CACHE_DIR / "state.json"
+# 座標變動超過此距離（公尺）視為搬遷，其餘欄位變動視為更新
+MOVED_THRESHOLD_M = 1.0
 
 PRIMARY_SOURCE = {
     "name": "7-11 store JSON",
@@ -22,6 +41,10 @@ SUPPLEMENTAL_SOURCE = {
     "url": "https://raw.githubusercontent.com/Cojad/taiwan-7Eleven-store/refs/heads/master/stores.yaml",
 }
 
+# 與 search_core/fallback.py 的 MappedStoreTable 對應的欄式二進位格式，magic 共用 search_core.config 的定義
+BINARY_VERSION = 1
+BINARY_ALIGN = 8
+
 CITY_AREA_RE = re.compile(r"^(..[市縣])(..?[鄉鎮市區])")
 YAML_KEY_RE = re.compile(r"^'(?P<store_id>\d+)':\s*$")
 
@@ -38,6 +61,54 @@ def fetch_json(url: str):
     return response.json()
 
 
+def load_source_cache_state():
+    if not SOURCE_CACHE_STATE_PATH.exists():
+        return {}
+    return json.loads(SOURCE_CACHE_STATE_PATH.read_text(encoding="utf-8"))
+
+
+def source_cache_path(url: str) -> Path:
+    return SOURCE_CACHE_DIR / Path(url).name
+
+
+def fetch_conditional(url: str, cache_entry):
+    """
+    以 If-None-Match / If-Modified-Since 下載上游檔案，回傳 (body, changed, cache_entry)。
+    304 或內容雜湊與上次相同時 changed 為 False，body 取自本地快取。
+    """
+    cached_path = source_cache_path(url)
+    headers = {}
+    if cache_entry and cached_path.exists():
+        if cache_entry.get("etag"):
+            headers["If-None-Match"] = cache_entry["etag"]
+        if cache_entry.get("last_modified"):
+            headers["If-Modified-Since"] = cache_entry["last_modified"]
+
+    response = requests.get(url, headers=headers, timeout=60)
+    if response.status_code == 304:
+        return cached_path.read_bytes(), False, cache_entry
+    response.raise_for_status()
+
+    body = response.content
+    entry = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "sha256": hashlib.sha256(body).hexdigest(),
+    }
+    changed = not cache_entry or cache_entry.get("sha256") != entry["sha256"] or not cached_path.exists()
+    return body, changed, entry
+
+
+def save_source_cache(bodies, state):
+    SOURCE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    for url, body in bodies.items():
+        write_bytes_atomic(source_cache_path(url), body)
+    write_bytes_atomic(
+        SOURCE_CACHE_STATE_PATH,
+        (json.dumps(state, ensure_ascii=False, indent=2, sort_keys=True) + "\n").encode("utf-8"),
+    )
+
+
 def parse_simple_yaml(text: str):
     stores = {}
     current_id = None
@@ -142,28 +213,231 @@ def build_output(primary_json, supplemental_map):
     return payload, metadata
 
 
+def diff_stores(old_stores, new_stores):
+    """以門市 id 比對新舊資料，回傳精簡的變更紀錄。"""
+    old_by_id = {store["id"]: store for store in old_stores}
+    new_by_id = {store["id"]: store for store in new_stores}
+    changes = {
+        "added": [
+            {"id": store_id, "name": new_by_id[store_id]["name"]}
+            for store_id in sorted(new_by_id.keys() - old_by_id.keys())
+        ],
+        "removed": [
+            {"id": store_id, "name": old_by_id[store_id].get("name", "")}
+            for store_id in sorted(old_by_id.keys() - new_by_id.keys())
+        ],
+        "moved": [],
+        "updated": [],
+    }
+    for store_id in sorted(old_by_id.keys() & new_by_id.keys()):
+        old, new = old_by_id[store_id], new_by_id[store_id]
+        if old == new:
+            continue
+        moved_m = haversine_meters(old["lat"], old["lng"], new["lat"], new["lng"])
+        if moved_m >= MOVED_THRESHOLD_M:
+            changes["moved"].append({"id": store_id, "name": new["name"], "distance_m": round(moved_m, 1)})
+        else:
+            fields = sorted(key for key in old.keys() | new.keys() if old.get(key) != new.get(key))
+            changes["updated"].append({"id": store_id, "fields": fields})
+    return changes
+
+
+def change_counts(changes):
+    return {kind: len(entries) for kind, entries in changes.items()}
+
+
+def _little_endian_bytes(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def encode_string_column(values):
+    offsets = array("I", [0])
+    chunks = []
+    total = 0
+    for value in values:
+        encoded = (value or "").encode("utf-8")
+        chunks.append(encoded)
+        total += len(encoded)
+        offsets.append(total)
+    return _little_endian_bytes(offsets), b"".join(chunks)
+
+
+def build_binary_dataset(payload) -> bytes:
+    """
+    將 JSON payload 轉為欄式二進位格式：
+    magic + header 長度(uint32) + header JSON，之後為 8-byte 對齊的各區段。
+    lat / lng 為 float64 array；id / name / address 為 uint32 位移表加 UTF-8 資料區。
+    """
+    stores = payload["stores"]
+    sections = [
+        ("lat", _little_endian_bytes(array("d", (store["lat"] for store in stores)))),
+        ("lng", _little_endian_bytes(array("d", (store["lng"] for store in stores)))),
+    ]
+    for column in ("id", "name", "address"):
+        offsets, data = encode_string_column(str(store.get(column, "")) for store in stores)
+        sections.append((f"{column}_offsets", offsets))
+        sections.append((f"{column}_data", data))
+
+    def header_bytes(section_table):
+        header = {
+            "version": BINARY_VERSION,
+            "count": len(stores),
+            "generated_at": payload.get("generated_at"),
+            "sections": section_table,
+        }
+        return json.dumps(header, ensure_ascii=False, sort_keys=True).encode("utf-8")
+
+    def align(offset):
+        return (offset + BINARY_ALIGN - 1) // BINARY_ALIGN * BINARY_ALIGN
+
+    # header 長度會影響區段位移，先以暫定位移計算直到長度穩定
+    section_table = {name: [0, len(data)] for name, data in sections}
+    while True:
+        header = header_bytes(section_table)
+        offset = align(len(SEVEN_ELEVEN_BINARY_MAGIC) + 4 + len(header))
+        new_table = {}
+        for name, data in sections:
+            new_table[name] = [offset, len(data)]
+            offset = align(offset + len(data))
+        if new_table == section_table:
+            break
+        section_table = new_table
+
+    out = bytearray(SEVEN_ELEVEN_BINARY_MAGIC)
+    out += struct.pack("<I", len(header))
+    out += header
+    for name, data in sections:
+        out += b"\0" * (section_table[name][0] - len(out))
+        out += data
+    return bytes(out)
+
+
+def write_bytes_atomic(path: Path, data: bytes):
+    # 以新檔取代舊檔，已 mmap 舊檔的 process 不會讀到寫到一半的內容
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def write_json_atomic(path: Path, value):
+    write_bytes_atomic(path, (json.dumps(value, ensure_ascii=False, indent=2) + "\n").encode("utf-8"))
+
+
+def write_outputs(payload, metadata):
+    write_json_atomic(STORES_PATH, payload)
+    write_json_atomic(METADATA_PATH, metadata)
+    write_binary_dataset(payload)
+
+
+def write_binary_dataset(payload):
+    write_bytes_atomic(STORES_BIN_PATH, build_binary_dataset(payload))
+
+
+def rebuild_binary_from_json():
+    payload = json.loads(STORES_PATH.read_text(encoding="utf-8"))
+    write_binary_dataset(payload)
+    print(
+        json.dumps(
+            {
+                "stores_path": str(STORES_PATH),
+                "binary_path": str(STORES_BIN_PATH),
+                "count": len(payload.get("stores", [])),
+            },
+            ensure_ascii=False,
+            indent=2,
+        )
+    )
+
+
+def refresh_incremental():
+    """
+    只在上游有變動時重建資料：先以條件式 GET 檢查兩個來源，
+    有變動時再逐店比對現有 JSON，門市資料真的不同才以原子寫入更新輸出檔並追加 changelog。
+    """
+    state = load_source_cache_state()
+    bodies = {}
+    any_changed = False
+    for source in (PRIMARY_SOURCE, SUPPLEMENTAL_SOURCE):
+        body, changed, entry = fetch_conditional(source["url"], state.get(source["url"]))
+        bodies[source["url"]] = body
+        state[source["url"]] = entry
+        any_changed = any_changed or changed
+
+    result = {"stores_path": str(STORES_PATH), "changed": False}
+    if not any_changed and STORES_PATH.exists():
+        result["reason"] = "sources_not_modified"
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    primary_json = json.loads(bodies[PRIMARY_SOURCE["url"]])
+    supplemental_map = parse_simple_yaml(bodies[SUPPLEMENTAL_SOURCE["url"]].decode("utf-8"))
+    payload, metadata = build_output(primary_json, supplemental_map)
+
+    old_stores = []
+    if STORES_PATH.exists():
+        old_stores = json.loads(STORES_PATH.read_text(encoding="utf-8")).get("stores", [])
+    changes = diff_stores(old_stores, payload["stores"])
+    counts = change_counts(changes)
+    if any(counts.values()):
+        metadata["last_changes"] = counts
+        write_outputs(payload, metadata)
+        with CHANGELOG_PATH.open("a", encoding="utf-8") as f:
+            f.write(
+                json.dumps(
+                    {"generated_at": payload["generated_at"], **changes},
+                    ensure_ascii=False,
+                    separators=(",", ":"),
+                )
+                + "\n"
+            )
+        result.update(changed=True, generated_at=payload["generated_at"], counts=metadata["counts"])
+    else:
+        result["reason"] = "stores_unchanged"
+    # 輸出檔處理完成後才記錄 validator，失敗的執行下次會重新下載
+    save_source_cache(bodies, state)
+    result["changes"] = counts
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
 def main():
+    parser = argparse.ArgumentParser(description="更新本地 7-11 fallback 門市資料")
+    parser.add_argument(
+        "--binary-only",
+        action="store_true",
+        help="不下載上游資料，只由現有 JSON 重建二進位檔",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="以條件式 GET 檢查上游，門市資料有變動時才更新輸出檔並寫入 changelog",
+    )
+    args = parser.parse_args()
+
     DATA_DIR.mkdir(parents=True, exist_ok=True)
 
+    if args.binary_only:
+        rebuild_binary_from_json()
+        return
+
+    if args.incremental:
+        refresh_incremental()
+        return
+
     primary_json = fetch_json(PRIMARY_SOURCE["url"])
     supplemental_text = fetch_text(SUPPLEMENTAL_SOURCE["url"])
     supplemental_map = parse_simple_yaml(supplemental_text)
 
     payload, metadata = build_output(primary_json, supplemental_map)
-
-    STORES_PATH.write_text(
-        json.dumps(payload, ensure_ascii=False, indent=2) + "\n",
-        encoding="utf-8",
-    )
-    METADATA_PATH.write_text(
-        json.dumps(metadata, ensure_ascii=False, indent=2) + "\n",
-        encoding="utf-8",
-    )
+    write_outputs(payload, metadata)
 
     print(
         json.dumps(
             {
                 "stores_path": str(STORES_PATH),
+                "binary_path": str(STORES_BIN_PATH),
                 "metadata_path": str(METADATA_PATH),
                 "generated_at": metadata["generated_at"],
                 "counts": metadata["counts"],
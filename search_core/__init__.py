@@ -0,0 +1,44 @@
+"""
+附近超商即期品的搜尋核心：門市資料來源、距離計算、篩選與結果 HTML 輸出，不依賴 Gradio。
+
+子模組在第一次取用時才載入，例如只用到 filter_results 時不會載入 requests 與 NumPy：
+
+    from search_core import fetch_nearby_stores_data, filter_results
+"""
+
+import importlib
+
+# 對外名稱 → 所在子模組
+_EXPORTS = {
+    "ResultSet": "results",
+    "ResultView": "results",
+    "build_result_row": "results",
+    "build_store_key": "results",
+    "filter_results": "filters",
+    "restrict_to_favorites": "filters",
+    "apply_filters": "filters",
+    "render_filtered_view": "filters",
+    "render_results_page": "filters",
+    "fetch_nearby_stores_data": "providers",
+    "fetch_nearby_stores_with_reports": "providers",
+    "stream_nearby_stores": "providers",
+    "providers_for_filter": "providers",
+    "STORE_PROVIDERS": "providers",
+    "categorize_tags": "tags",
+    "haversine_meters": "geo",
+    "geocode_address": "geocode",
+    "get_runtime_stats": "sessions",
+    "SearchCancelled": "cancellation",
+    "CancelToken": "cancellation",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
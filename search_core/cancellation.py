@@ -0,0 +1,91 @@
+"""搜尋取消：以 contextvars 將 CancelToken 傳入 worker thread，新搜尋開始時取消同 session 的舊搜尋。"""
+
+import contextvars
+import threading
+
+from .metrics import increment_metric
+
+
+class SearchCancelled(Exception):
+    """搜尋已被同一 session 較新的請求取代，尚未送出的上游呼叫不再執行。"""
+
+
+class CancelToken:
+    """單次搜尋的取消旗標，並記錄該次搜尋已送出的上游呼叫數。"""
+
+    def __init__(self, label=None):
+        self.label = label
+        self.cancelled = False
+        self.upstream_calls = 0
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def record_upstream_call(self):
+        with self._lock:
+            self.upstream_calls += 1
+
+
+_current_cancel_token = contextvars.ContextVar("current_cancel_token", default=None)
+
+
+def current_cancel_token():
+    return _current_cancel_token.get()
+
+
+def with_cancel_token(token, fn, *args):
+    """在 token 生效的情況下執行 fn；token 為 None 表示不可取消（例如共用的 token 更新）。"""
+    reset = _current_cancel_token.set(token)
+    try:
+        return fn(*args)
+    finally:
+        _current_cancel_token.reset(reset)
+
+
+def bind_cancel_token(fn):
+    """讓交給 worker thread 執行的 fn 沿用呼叫端目前的取消 token。"""
+    token = current_cancel_token()
+    return lambda *args: with_cancel_token(token, fn, *args)
+
+
+class SessionSearches:
+    """
+    追蹤每個 session 目前進行中的搜尋。
+    同一 session 開始新搜尋或送出不同參數時，舊搜尋會被取消，
+    尚未送出的上游呼叫直接略過，已送出的呼叫數計入 wasted 指標。
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def begin(self, session_id, label=None):
+        token = CancelToken(label)
+        with self._lock:
+            previous = self._tokens.get(session_id)
+            self._tokens[session_id] = token
+        if previous is not None:
+            self._cancel(previous)
+        increment_metric(f"search.{self.name}.started")
+        return token
+
+    def supersede(self, session_id, label):
+        """使用者送出新參數時立即取消參數不同的進行中搜尋，不必等新請求排到佇列前面。"""
+        with self._lock:
+            token = self._tokens.get(session_id)
+        if token is not None and token.label != label:
+            self._cancel(token)
+
+    def finish(self, session_id, token):
+        with self._lock:
+            if self._tokens.get(session_id) is token:
+                del self._tokens[session_id]
+        if token.cancelled:
+            increment_metric(f"search.{self.name}.wasted_upstream_calls", token.upstream_calls)
+
+    def _cancel(self, token):
+        if not token.cancelled:
+            token.cancel()
+            increment_metric(f"search.{self.name}.superseded")
@@ -0,0 +1,85 @@
+"""執行期設定：上游 API、資料檔路徑與可由環境變數調整的參數。"""
+
+import os
+from pathlib import Path
+from urllib.parse import urlsplit
+
+
+# =============== 7-11 所需常數 ===============
+# 請確認此處的 MID_V 是否有效，若過期請更新
+MID_V = "W0_DiF4DlgU5OeQoRswrRcaaNHMWOL7K3ra3381ocZUv-rdOWy-ZuIItG6T-7pjiccl0C5h41-cHaupfvgcXKJKifEvNt9NiU94M_ZVp42Ig7JEn15la5iV0H3-8dZfASc7Mgke95qb9LYu3ghJ5Sam6D0LAnYK9Lb0DZohVkl1N5OTvWXvPb4VqEek"
+USER_AGENT_7_11 = "Mozilla/5.0 (iPhone; CPU iPhone OS 17_6_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148"
+API_7_11_BASE = "https://lovefood.openpoint.com.tw/LoveFood/api"
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+SEVEN_ELEVEN_STORES_PATH = DATA_DIR / "seven_eleven_stores.json"
+# scripts/update_7_11_data.py 產生的欄式二進位版本，存在且不舊於 JSON 時優先使用
+SEVEN_ELEVEN_STORES_BIN_PATH = DATA_DIR / "seven_eleven_stores.bin"
+SEVEN_ELEVEN_BINARY_MAGIC = b"S711COL1"
+# 品項分類設定：各分類的標籤、圖示、關鍵字與排除詞
+ITEM_TAGS_PATH = Path(os.environ.get("ITEM_TAGS_PATH", str(DATA_DIR / "item_tags.json")))
+# fallback 門市格網索引的格子大小（度），約 5.5 km
+FALLBACK_GRID_CELL_DEG = float(os.environ.get("FALLBACK_GRID_CELL_DEG", "0.05"))
+# 檢查 fallback 門市資料檔是否更新的最短間隔秒數；更新後於背景重建索引再整組替換，設為 0 即停用
+FALLBACK_RELOAD_INTERVAL_SECONDS = float(os.environ.get("FALLBACK_RELOAD_INTERVAL_SECONDS", "30"))
+# 結果表格每頁顯示的商品列數，只有目前頁面的 HTML 會送到瀏覽器
+RESULTS_PAGE_SIZE = int(os.environ.get("RESULTS_PAGE_SIZE", "100"))
+# 同時進行中的 7-11 門市明細請求上限；設為 1 即回到逐店查詢
+SEVEN_ELEVEN_DETAIL_MAX_WORKERS = int(os.environ.get("SEVEN_ELEVEN_DETAIL_MAX_WORKERS", "8"))
+# 搜尋進行中逐步更新畫面的最短間隔秒數，避免每收到一間門市明細就重繪一次
+SEARCH_STREAM_INTERVAL_SECONDS = float(os.environ.get("SEARCH_STREAM_INTERVAL_SECONDS", "0.25"))
+# 所有 session 搜尋結果的估計記憶體上限（MB），超過時淘汰最久未使用的 session，被淘汰的 session 需重新搜尋
+SESSION_RESULTS_MAX_MB = float(os.environ.get("SESSION_RESULTS_MAX_MB", "256"))
+# 設為 1 時搜尋結果以精簡 JSON 送到瀏覽器一次，篩選與換頁改在前端完成，不再回到伺服器
+CLIENT_SIDE_FILTERING = os.environ.get("CLIENT_SIDE_FILTERING", "0") == "1"
+
+# =============== FamilyMart 所需常數 ===============
+FAMILY_PROJECT_CODE = "202106302"  # 若有需要請自行調整
+API_FAMILY = "https://stamp.family.com.tw/api/maps/MapProductInfo"
+
+# token 有效時間與提前背景更新的秒數（於到期前 margin 秒內觸發）
+SEVEN_ELEVEN_TOKEN_TTL_SECONDS = float(os.environ.get("SEVEN_ELEVEN_TOKEN_TTL_SECONDS", "1800"))
+SEVEN_ELEVEN_TOKEN_REFRESH_MARGIN_SECONDS = float(
+    os.environ.get("SEVEN_ELEVEN_TOKEN_REFRESH_MARGIN_SECONDS", "120")
+)
+
+# =============== Google Geocoding 快取設定 ===============
+GEOCODE_API_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+GEOCODE_CACHE_PATH = Path(
+    os.environ.get("GEOCODE_CACHE_PATH", str(DATA_DIR / "geocode_cache.sqlite3"))
+)
+GEOCODE_CACHE_MAX_ENTRIES = int(os.environ.get("GEOCODE_CACHE_MAX_ENTRIES", "5000"))
+GEOCODE_CACHE_TTL_SECONDS = float(os.environ.get("GEOCODE_CACHE_TTL_SECONDS", str(30 * 86400)))
+
+# =============== 附近門市清單快取設定 ===============
+# 以固定經緯度格網（cell_deg 度）為 key 快取上游附近門市回應；ttl 設為 0 即停用。
+# 上游以使用者實際座標查詢；同格網其他座標只在回應含門市座標、能重算距離時共用回應。
+SPATIAL_CACHE_SETTINGS = {
+    "7-11": {
+        "cell_deg": float(os.environ.get("SEVEN_ELEVEN_NEARBY_CACHE_CELL_DEG", "0.001")),
+        "ttl_seconds": float(os.environ.get("SEVEN_ELEVEN_NEARBY_CACHE_TTL_SECONDS", "60")),
+    },
+    "全家": {
+        "cell_deg": float(os.environ.get("FAMILY_NEARBY_CACHE_CELL_DEG", "0.001")),
+        "ttl_seconds": float(os.environ.get("FAMILY_NEARBY_CACHE_TTL_SECONDS", "60")),
+    },
+}
+SPATIAL_CACHE_MAX_ENTRIES = int(os.environ.get("SPATIAL_CACHE_MAX_ENTRIES", "2048"))
+
+# =============== 上游 HTTP 連線設定 ===============
+# 快取的 host 連線池數量、每個 host 保留的 keep-alive 連線數，以及單次請求逾時秒數
+HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", "8"))
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "32"))
+HTTP_TIMEOUT_SECONDS = float(os.environ.get("HTTP_TIMEOUT_SECONDS", "15"))
+# 依 host 自動帶入的預設 headers，呼叫端傳入的 headers 會覆蓋同名欄位
+UPSTREAM_DEFAULT_HEADERS = {
+    urlsplit(API_7_11_BASE).hostname: {"user-agent": USER_AGENT_7_11},
+}
+
+# =============== JSON API 設定 ===============
+# 設為 0 時只啟動 Gradio 介面，不提供 /api/search JSON 端點
+JSON_API_ENABLED = os.environ.get("JSON_API_ENABLED", "1") == "1"
+# 單次批次查詢最多的查詢數，以及同時執行的查詢數
+JSON_API_BATCH_MAX_QUERIES = int(os.environ.get("JSON_API_BATCH_MAX_QUERIES", "50"))
+JSON_API_BATCH_MAX_WORKERS = int(os.environ.get("JSON_API_BATCH_MAX_WORKERS", "8"))
+# 搜尋半徑上限（公里），介面的距離滑桿與 JSON API 共用
+MAX_SEARCH_RADIUS_KM = 21
@@ -0,0 +1,240 @@
+"""本地 7-11 fallback 門市資料：mmap 二進位檔或 JSON，支援不重啟更新。"""
+
+import json
+import mmap
+import struct
+import threading
+import time
+
+import numpy as np
+
+from .config import (
+    FALLBACK_GRID_CELL_DEG,
+    FALLBACK_RELOAD_INTERVAL_SECONDS,
+    SEVEN_ELEVEN_BINARY_MAGIC,
+    SEVEN_ELEVEN_STORES_BIN_PATH,
+    SEVEN_ELEVEN_STORES_PATH,
+)
+from .geo import StoreGridIndex
+from .metrics import increment_metric
+
+
+def load_7_11_fallback_stores():
+    if not SEVEN_ELEVEN_STORES_PATH.exists():
+        print(f"⚠️ 找不到 7-11 fallback 資料: {SEVEN_ELEVEN_STORES_PATH}")
+        return []
+
+    with SEVEN_ELEVEN_STORES_PATH.open("r", encoding="utf-8") as f:
+        payload = json.load(f)
+    return payload.get("stores", [])
+
+
+class StoreTable:
+    """由 JSON 門市清單建立的欄式門市資料，介面與 MappedStoreTable 相同。"""
+
+    def __init__(self, stores):
+        self._stores = stores
+        self.lats = np.ascontiguousarray([store["lat"] for store in stores], dtype=np.float64)
+        self.lngs = np.ascontiguousarray([store["lng"] for store in stores], dtype=np.float64)
+
+    def __len__(self):
+        return len(self._stores)
+
+    def store_id(self, idx):
+        return str(self._stores[idx]["id"])
+
+    def name(self, idx):
+        return self._stores[idx]["name"]
+
+    def address(self, idx):
+        return self._stores[idx].get("address", "")
+
+
+class MappedStoreTable:
+    """
+    以 mmap 讀取 seven_eleven_stores.bin，座標直接以 NumPy view 指向檔案頁面，
+    多個 worker process 共用同一份 page cache；字串欄位只在取用時解碼。
+
+    檔案格式（little-endian，由 scripts/update_7_11_data.py 寫出）：
+    magic(8 bytes) + header 長度(uint32) + header JSON，之後為 8-byte 對齊的各區段：
+    lat / lng 為 float64[count]；id / name / address 為 uint32[count + 1] 位移表加 UTF-8 資料區。
+    """
+
+    STRING_COLUMNS = ("id", "name", "address")
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[: len(SEVEN_ELEVEN_BINARY_MAGIC)] != SEVEN_ELEVEN_BINARY_MAGIC:
+            raise ValueError(f"不是有效的 7-11 二進位門市資料: {path}")
+        header_offset = len(SEVEN_ELEVEN_BINARY_MAGIC)
+        (header_len,) = struct.unpack_from("<I", self._mm, header_offset)
+        header_start = header_offset + 4
+        self.header = json.loads(self._mm[header_start : header_start + header_len].decode("utf-8"))
+        self.count = self.header["count"]
+        self.lats = self._array("lat", "<f8", self.count)
+        self.lngs = self._array("lng", "<f8", self.count)
+        self._string_columns = {
+            column: (
+                self._array(f"{column}_offsets", "<u4", self.count + 1),
+                self.header["sections"][f"{column}_data"][0],
+            )
+            for column in self.STRING_COLUMNS
+        }
+
+    def _array(self, section, dtype, count):
+        offset, _ = self.header["sections"][section]
+        return np.frombuffer(self._mm, dtype=dtype, count=count, offset=offset)
+
+    def _string(self, column, idx):
+        offsets, data_offset = self._string_columns[column]
+        start = data_offset + int(offsets[idx])
+        end = data_offset + int(offsets[idx + 1])
+        return self._mm[start:end].decode("utf-8")
+
+    def __len__(self):
+        return self.count
+
+    def store_id(self, idx):
+        return self._string("id", idx)
+
+    def name(self, idx):
+        return self._string("name", idx)
+
+    def address(self, idx):
+        return self._string("address", idx)
+
+
+def read_7_11_fallback_table():
+    """
+    讀取 fallback 門市資料檔：優先使用 mmap 的二進位檔，
+    不存在、比 JSON 舊或格式錯誤時退回解析 JSON。
+    """
+    bin_path = SEVEN_ELEVEN_STORES_BIN_PATH
+    json_path = SEVEN_ELEVEN_STORES_PATH
+    if bin_path.exists() and (
+        not json_path.exists() or bin_path.stat().st_mtime >= json_path.stat().st_mtime
+    ):
+        try:
+            return MappedStoreTable(bin_path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ 無法讀取 7-11 二進位門市資料，改用 JSON: {e}")
+    return StoreTable(load_7_11_fallback_stores())
+
+
+class FallbackSnapshot:
+    """某一版 fallback 門市資料：門市表與格網索引一起建立、一起替換。"""
+
+    __slots__ = ("signature", "table", "index", "version", "loaded_at")
+
+    def __init__(self, signature, table, index, version):
+        self.signature = signature
+        self.table = table
+        self.index = index
+        self.version = version
+        self.loaded_at = time.time()
+
+
+class FallbackDataset:
+    """
+    可熱更新的 fallback 門市資料。
+    取用時最多每 check_interval_seconds 秒比對一次 JSON 與二進位檔的 mtime / 大小，
+    有變動時在背景 thread 讀檔並建立格網索引，完成後才整組替換 snapshot；
+    進行中的搜尋持有舊 snapshot 直到結束，不會讀到載入一半的資料。
+    舊的 mmap 指向被取代前的檔案，最後一個使用者釋放後才關閉。
+    """
+
+    def __init__(self, check_interval_seconds, cell_deg):
+        self._check_interval = check_interval_seconds
+        self._cell_deg = cell_deg
+        self._snapshot = None
+        self._next_check = 0.0
+        self._load_lock = threading.Lock()
+        self._background_lock = threading.Lock()
+        self._background_running = False
+
+    @staticmethod
+    def _signature():
+        signature = []
+        for path in (SEVEN_ELEVEN_STORES_PATH, SEVEN_ELEVEN_STORES_BIN_PATH):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                signature.append(None)
+            else:
+                signature.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def current(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._load_lock:
+                if self._snapshot is None:
+                    self._snapshot = self._build(None)
+                return self._snapshot
+
+        if self._check_interval > 0:
+            now = time.monotonic()
+            if now >= self._next_check:
+                self._next_check = now + self._check_interval
+                if self._signature() != snapshot.signature:
+                    self._start_background_reload()
+        return snapshot
+
+    def _build(self, previous):
+        # 更新腳本依序寫入 JSON 與二進位檔，讀取期間檔案又變動時重讀，避免停在中間狀態
+        for _ in range(3):
+            signature = self._signature()
+            table = read_7_11_fallback_table()
+            index = StoreGridIndex(table, self._cell_deg)
+            if self._signature() == signature:
+                break
+        version = previous.version + 1 if previous else 1
+        return FallbackSnapshot(signature, table, index, version)
+
+    def _start_background_reload(self):
+        with self._background_lock:
+            if self._background_running:
+                return
+            self._background_running = True
+        threading.Thread(target=self._background_reload, daemon=True).start()
+
+    def _background_reload(self):
+        try:
+            with self._load_lock:
+                previous = self._snapshot
+                if previous is not None and self._signature() == previous.signature:
+                    return
+                snapshot = self._build(previous)
+                self._snapshot = snapshot
+            increment_metric("fallback_dataset.reloads")
+            print(f"🔄 已重新載入 7-11 fallback 門市資料（{len(snapshot.table)} 間，第 {snapshot.version} 版）")
+        except Exception as e:
+            increment_metric("fallback_dataset.reload_failures")
+            print(f"⚠️ 重新載入 7-11 fallback 門市資料失敗，沿用現有資料: {e}")
+        finally:
+            with self._background_lock:
+                self._background_running = False
+
+    def stats(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"loaded": False}
+        return {
+            "loaded": True,
+            "version": snapshot.version,
+            "stores": len(snapshot.table),
+            "format": "binary" if isinstance(snapshot.table, MappedStoreTable) else "json",
+            "age_seconds": round(time.time() - snapshot.loaded_at, 1),
+        }
+
+
+fallback_dataset = FallbackDataset(FALLBACK_RELOAD_INTERVAL_SECONDS, FALLBACK_GRID_CELL_DEG)
+
+
+def load_7_11_fallback_table():
+    return fallback_dataset.current().table
+
+
+def load_7_11_fallback_index():
+    return fallback_dataset.current().index
@@ -0,0 +1,137 @@
+"""搜尋結果的篩選與對應的摘要 / 表格輸出。"""
+
+import math
+
+from .render import clamp_page, render_error, render_summary, render_table
+from .results import ResultSet, ResultView
+from .tags import tags_to_mask
+
+
+def filter_results(
+    results,
+    distance_km,
+    store_filter,
+    only_under_1km,
+    only_in_stock,
+    tag_include,
+    tag_exclude,
+    only_favorites,
+    favorites,
+    ignore_only_favorites=False,
+):
+    """
+    單次掃描完成所有篩選，回傳 ResultView。
+    ResultSet 的商品列已依距離排序，結果直接保持順序不需再排序；
+    門市層級條件每店只判斷一次，標籤以 bitmask 比對。
+    """
+    if not isinstance(results, ResultSet):
+        results = ResultSet.from_rows(results or []).sorted_by_distance()
+
+    max_distance = float(distance_km) * 1000 if distance_km else math.inf
+    if only_under_1km:
+        max_distance = min(max_distance, 1000)
+    wanted_type = {"只看 7-11": "7-11", "只看 全家": "全家"}.get(store_filter)
+    favorites_set = set(favorites or []) if only_favorites and not ignore_only_favorites else None
+    store_ok = [
+        (wanted_type is None or store_type == wanted_type)
+        and (favorites_set is None or store_key in favorites_set)
+        for store_type, store_key in zip(results.store_types, results.store_keys)
+    ]
+    stock_exempt = [source == "7-11-fallback" for source in results.store_sources]
+    include_mask = tags_to_mask(tag_include)
+    exclude_mask = tags_to_mask(tag_exclude)
+
+    store_distances = results.store_distances
+    item_qtys = results.item_qtys
+    item_masks = results.item_tag_masks
+    indices = []
+    for i, store_idx in enumerate(results.item_stores):
+        if store_distances[store_idx] > max_distance:
+            break
+        if not store_ok[store_idx]:
+            continue
+        if only_in_stock and item_qtys[i] <= 0 and not stock_exempt[store_idx]:
+            continue
+        mask = item_masks[i]
+        if include_mask and not mask & include_mask:
+            continue
+        if mask & exclude_mask:
+            continue
+        indices.append(i)
+
+    return ResultView(results, indices)
+
+
+def restrict_to_favorites(view, favorites):
+    """由已篩選的 ResultView 取出愛店的商品列，不需重新篩選整個結果集。"""
+    favorites_set = set(favorites or [])
+    results = view.results
+    store_is_favorite = [key in favorites_set for key in results.store_keys]
+    item_stores = results.item_stores
+    return ResultView(results, [i for i in view if store_is_favorite[item_stores[i]]])
+
+
+def render_filtered_view(view, page=0):
+    if not view:
+        return "", render_error("❌ 沒有符合篩選條件的結果")
+    return render_summary(view), render_table(view, page)
+
+
+def apply_filters(
+    results,
+    distance_km,
+    store_filter,
+    only_under_1km,
+    only_in_stock,
+    tag_include,
+    tag_exclude,
+    only_favorites,
+    favorites,
+):
+    if not results:
+        return "", render_error("❌ 尚未搜尋，請先按下「自動定位並搜尋」")
+
+    filtered = filter_results(
+        results,
+        distance_km,
+        store_filter,
+        only_under_1km,
+        only_in_stock,
+        tag_include,
+        tag_exclude,
+        only_favorites,
+        favorites,
+    )
+    return render_filtered_view(filtered)
+
+
+def render_results_page(
+    results,
+    page,
+    distance_km,
+    store_filter,
+    only_under_1km,
+    only_in_stock,
+    tag_include,
+    tag_exclude,
+    only_favorites,
+    favorites,
+):
+    """換頁時只重新輸出表格，回傳 (table_html, 修正後的頁碼)。"""
+    if not results:
+        return render_error("❌ 尚未搜尋，請先按下「自動定位並搜尋」"), 0
+    view = filter_results(
+        results,
+        distance_km,
+        store_filter,
+        only_under_1km,
+        only_in_stock,
+        tag_include,
+        tag_exclude,
+        only_favorites,
+        favorites,
+    )
+    if not view:
+        return render_error("❌ 沒有符合篩選條件的結果"), 0
+    page = clamp_page(len(view), page)
+    return render_table(view, page), page
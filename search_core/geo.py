@@ -0,0 +1,109 @@
+"""距離計算與 fallback 門市的格網索引。"""
+
+import math
+
+import numpy as np
+
+
+def haversine_meters(lat1, lon1, lat2, lon2):
+    radius_m = 6371000
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    delta_phi = math.radians(lat2 - lat1)
+    delta_lambda = math.radians(lon2 - lon1)
+    a = (
+        math.sin(delta_phi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
+    )
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return radius_m * c
+
+
+EARTH_RADIUS_M = 6371000.0
+# 與 haversine 使用同一個地球半徑，bounding box 才不會比精確距離的範圍小
+METERS_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_M / 180
+# bounding box 只負責粗篩，多放寬 1% 避免浮點誤差剛好切掉邊界上的門市
+BBOX_MARGIN = 1.01
+
+
+def haversine_meters_vec(lat, lon, lats, lons):
+    """
+    以 NumPy 一次計算單一查詢點到多個座標的距離（公尺）。
+    lats / lons 為等長的 float array，回傳同長度的 float64 array。
+    """
+    lat1 = np.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlon = np.radians(lons) - np.radians(lon)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def haversine_matrix(query_lats, query_lons, lats, lons):
+    """多個查詢點對多個座標的距離矩陣，shape 為 (查詢點數, 座標數)。"""
+    query_lats = np.asarray(query_lats, dtype=np.float64)[:, None]
+    query_lons = np.asarray(query_lons, dtype=np.float64)[:, None]
+    return haversine_meters_vec(query_lats, query_lons, lats[None, :], lons[None, :])
+
+
+class StoreGridIndex:
+    """
+    fallback 門市的均勻經緯度格網索引，於載入資料時建立一次。
+    座標存放在連續的 float64 array；半徑查詢只檢查涵蓋 bounding box 的格子，
+    以 bounding box 粗篩後再用 NumPy 一次計算候選門市的精確距離。
+    """
+
+    def __init__(self, table, cell_deg):
+        self.table = table
+        self.cell_deg = cell_deg
+        self.lats = table.lats
+        self.lons = table.lngs
+        buckets = {}
+        rows = np.floor(self.lats / cell_deg).astype(np.int64)
+        cols = np.floor(self.lons / cell_deg).astype(np.int64)
+        for idx, cell in enumerate(zip(rows.tolist(), cols.tolist())):
+            buckets.setdefault(cell, []).append(idx)
+        self.cells = {cell: np.asarray(ids, dtype=np.int64) for cell, ids in buckets.items()}
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def _candidates(self, lat, lon, radius_m):
+        dlat = radius_m / METERS_PER_DEGREE_LAT * BBOX_MARGIN
+        # 經度寬度以 box 內離赤道最遠的緯度計算，圓的南北兩側經線間距較查詢點窄
+        edge_lat = min(abs(lat) + dlat, 90.0)
+        dlon = min(dlat / max(math.cos(math.radians(edge_lat)), 1e-6), 180.0)
+        row_min, col_min = self._cell(lat - dlat, lon - dlon)
+        row_max, col_max = self._cell(lat + dlat, lon + dlon)
+        parts = [
+            self.cells[(row, col)]
+            for row in range(row_min, row_max + 1)
+            for col in range(col_min, col_max + 1)
+            if (row, col) in self.cells
+        ]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        candidates = np.concatenate(parts)
+        cand_lats = self.lats[candidates]
+        cand_lons = self.lons[candidates]
+        in_box = (
+            (cand_lats >= lat - dlat)
+            & (cand_lats <= lat + dlat)
+            & (cand_lons >= lon - dlon)
+            & (cand_lons <= lon + dlon)
+        )
+        return candidates[in_box]
+
+    def query_indices(self, lat, lon, radius_m=None):
+        """回傳 (門市索引 array, 距離 array)；radius_m 為 None 時涵蓋全部門市。"""
+        if radius_m is None:
+            return np.arange(len(self.table)), haversine_meters_vec(lat, lon, self.lats, self.lons)
+        candidates = self._candidates(lat, lon, radius_m)
+        distances = haversine_meters_vec(lat, lon, self.lats[candidates], self.lons[candidates])
+        within = distances <= radius_m
+        return candidates[within], distances[within]
+
+    def query_radius(self, lat, lon, radius_m=None):
+        """回傳 [(門市索引, distance_m), ...]；radius_m 為 None 時回傳全部門市。"""
+        indices, distances = self.query_indices(lat, lon, radius_m)
+        return list(zip(indices.tolist(), distances.tolist()))
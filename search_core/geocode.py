@@ -0,0 +1,165 @@
+"""Google Geocoding 地址轉座標與本機 SQLite 快取。"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+
+from .config import (
+    GEOCODE_API_URL,
+    GEOCODE_CACHE_MAX_ENTRIES,
+    GEOCODE_CACHE_PATH,
+    GEOCODE_CACHE_TTL_SECONDS,
+)
+from .metrics import increment_metric
+from .upstream import upstream_request
+
+
+ADDRESS_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_address(address: str):
+    """地址正規化後作為快取 key：全形轉半形、去除空白、臺→台、英文小寫。"""
+    text = unicodedata.normalize("NFKC", address or "")
+    text = ADDRESS_WHITESPACE_RE.sub("", text)
+    return text.replace("臺", "台").lower()
+
+
+class GeocodeCache:
+    """
+    以 SQLite 儲存在本機磁碟的地址 → 座標快取。
+    超過 ttl_seconds 的項目視為過期；筆數超過 max_entries 時淘汰最久未使用的項目。
+    """
+
+    def __init__(self, path, max_entries, ttl_seconds):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disabled = max_entries <= 0
+
+    def _connect(self):
+        if self._conn is None and not self._disabled:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(str(self.path), check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS geocode (
+                        key TEXT PRIMARY KEY,
+                        lat REAL NOT NULL,
+                        lon REAL NOT NULL,
+                        created_at REAL NOT NULL,
+                        last_used REAL NOT NULL
+                    )
+                    """
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS geocode_last_used ON geocode(last_used)")
+                conn.commit()
+                self._conn = conn
+            except sqlite3.Error as e:
+                print(f"⚠️ 無法開啟地址快取 {self.path}，停用快取: {e}")
+                self._disabled = True
+        return self._conn
+
+    def get(self, address: str):
+        key = normalize_address(address)
+        with self._lock:
+            conn = self._connect()
+            if conn is None or not key:
+                self._count_miss()
+                return None
+            now = time.time()
+            row = conn.execute(
+                "SELECT lat, lon, created_at FROM geocode WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[2] > self.ttl_seconds:
+                self._count_miss()
+                return None
+            conn.execute("UPDATE geocode SET last_used = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self.hits += 1
+            increment_metric("geocode_cache.hits")
+            return row[0], row[1]
+
+    def _count_miss(self):
+        self.misses += 1
+        increment_metric("geocode_cache.misses")
+
+    def put(self, address: str, lat: float, lon: float):
+        key = normalize_address(address)
+        with self._lock:
+            conn = self._connect()
+            if conn is None or not key:
+                return
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO geocode (key, lat, lon, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, lat, lon, now, now),
+            )
+            conn.execute(
+                "DELETE FROM geocode WHERE key IN ("
+                "SELECT key FROM geocode ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            conn.commit()
+
+    def stats(self):
+        with self._lock:
+            # 尚未查詢過地址時不為了統計而建立資料庫檔案
+            conn = self._conn
+            entries = conn.execute("SELECT COUNT(*) FROM geocode").fetchone()[0] if conn else 0
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": entries,
+                "max_entries": self.max_entries,
+            }
+
+
+geocode_cache = GeocodeCache(
+    GEOCODE_CACHE_PATH,
+    GEOCODE_CACHE_MAX_ENTRIES,
+    GEOCODE_CACHE_TTL_SECONDS,
+)
+
+
+def geocode_address(address: str):
+    """
+    將地址轉為 (lat, lon)，優先使用本機快取，未命中才呼叫 Google Geocoding API。
+    轉換失敗時拋出 RuntimeError。
+    """
+    cached = geocode_cache.get(address)
+    if cached is not None:
+        print(f"地址快取命中: {address} => lat={cached[0]}, lon={cached[1]}")
+        return cached
+
+    googlekey = os.environ.get("googlekey")
+    if not googlekey:
+        raise RuntimeError("未設定 googlekey，請於 Huggingface Space Secrets 設定。")
+    params = {
+        "address": address,
+        "key": googlekey
+    }
+    resp = upstream_request("GET", GEOCODE_API_URL, params=params)
+    resp.raise_for_status()
+    data = resp.json()
+    if data.get("status") != "OK" or not data.get("results"):
+        raise RuntimeError(f"Google Geocoding 回應異常: {data}")
+    location = data["results"][0]["geometry"]["location"]
+    lat = float(location["lat"])
+    lon = float(location["lng"])
+    geocode_cache.put(address, lat, lon)
+    print(f"地址轉換成功: {address} => lat={lat}, lon={lon}")
+    return lat, lon
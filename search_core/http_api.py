@@ -0,0 +1,119 @@
+"""JSON 搜尋 API（FastAPI）：單點與批次查詢，回傳結構化的商品列，不含 HTML。"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Literal, Optional
+
+from fastapi import FastAPI
+from pydantic import BaseModel, Field, field_validator
+
+from .cancellation import bind_cancel_token
+from .config import JSON_API_BATCH_MAX_QUERIES, JSON_API_BATCH_MAX_WORKERS, MAX_SEARCH_RADIUS_KM
+from .filters import filter_results
+from .metrics import increment_metric
+from .providers import fetch_nearby_stores_with_reports, providers_for_filter
+from .sessions import get_runtime_stats
+from .tags import TAG_ICONS
+
+
+class SearchQuery(BaseModel):
+    """單一查詢點與篩選條件，欄位意義與介面上的篩選相同。"""
+
+    lat: float = Field(ge=-90, le=90)
+    lon: float = Field(ge=-180, le=180)
+    radius_km: float = Field(3, gt=0, le=MAX_SEARCH_RADIUS_KM)
+    store_filter: Literal["全部", "只看 7-11", "只看 全家"] = "全部"
+    only_under_1km: bool = False
+    only_in_stock: bool = True
+    tag_include: List[str] = []
+    tag_exclude: List[str] = []
+    # store_key（例如 "7-11:123456"）清單，非空時只回傳這些門市的商品
+    favorites: List[str] = []
+    # 最多回傳的商品列數，total_rows 仍為篩選後的總數
+    limit: Optional[int] = Field(None, ge=1)
+
+    @field_validator("tag_include", "tag_exclude")
+    @classmethod
+    def check_tags(cls, tags):
+        unknown = [tag for tag in tags if tag not in TAG_ICONS]
+        if unknown:
+            raise ValueError(f"未知的品項分類: {', '.join(unknown)}")
+        return tags
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[SearchQuery] = Field(min_length=1, max_length=JSON_API_BATCH_MAX_QUERIES)
+
+
+def run_search(query: SearchQuery):
+    """執行單一查詢，回傳可直接序列化為 JSON 的 dict。"""
+    results, reports = fetch_nearby_stores_with_reports(
+        query.lat, query.lon, query.radius_km, providers_for_filter(query.store_filter)
+    )
+    view = filter_results(
+        results,
+        query.radius_km,
+        query.store_filter,
+        query.only_under_1km,
+        query.only_in_stock,
+        query.tag_include,
+        query.tag_exclude,
+        bool(query.favorites),
+        query.favorites,
+    )
+    indices = list(view)[: query.limit] if query.limit else view.indices
+    rows = view.results.rows(indices)
+    for row in rows:
+        # store_label 為介面用的 HTML
+        row.pop("store_label", None)
+    return {
+        "lat": query.lat,
+        "lon": query.lon,
+        "radius_km": query.radius_km,
+        "total_rows": len(view),
+        "stores": len(view.store_indices()),
+        "rows": rows,
+        "providers": reports,
+    }
+
+
+def run_search_safely(query: SearchQuery):
+    try:
+        return run_search(query)
+    except Exception as e:
+        print(f"❌ 批次查詢失敗 lat={query.lat}, lon={query.lon}: {e}")
+        return {"lat": query.lat, "lon": query.lon, "radius_km": query.radius_km, "error": str(e)}
+
+
+def run_batch_search(queries, max_workers=None):
+    """
+    同時執行多個查詢，回傳與 queries 同順序的結果。
+    相鄰查詢點的附近門市清單與門市明細會經由共用快取與 single-flight 合併，不會重複打上游。
+    """
+    max_workers = max_workers or JSON_API_BATCH_MAX_WORKERS
+    if max_workers <= 1 or len(queries) == 1:
+        return [run_search_safely(query) for query in queries]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(queries))) as executor:
+        return list(executor.map(bind_cancel_token(run_search_safely), queries))
+
+
+def create_app(api=None):
+    """建立（或在既有的 FastAPI app 上加入）JSON 搜尋端點。"""
+    api = api or FastAPI(title="便利商店即期食品查詢 API")
+
+    # 以一般函式宣告，查詢會在 FastAPI 的 thread pool 中執行，不阻塞 event loop
+    @api.post("/api/search")
+    def search(query: SearchQuery):
+        increment_metric("api.search.requests")
+        return run_search(query)
+
+    @api.post("/api/search/batch")
+    def search_batch(request: BatchSearchRequest):
+        increment_metric("api.search.batch_requests")
+        increment_metric("api.search.batch_queries", len(request.queries))
+        return {"results": run_batch_search(request.queries)}
+
+    @api.get("/api/stats")
+    def stats():
+        return get_runtime_stats()
+
+    return api
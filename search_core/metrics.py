@@ -0,0 +1,18 @@
+"""行程內的累計指標計數器。"""
+
+import threading
+from collections import Counter
+
+
+_metrics = Counter()
+_metrics_lock = threading.Lock()
+
+
+def increment_metric(name: str, amount: int = 1):
+    with _metrics_lock:
+        _metrics[name] += amount
+
+
+def get_metrics_snapshot():
+    with _metrics_lock:
+        return dict(sorted(_metrics.items()))
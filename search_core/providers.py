@@ -0,0 +1,405 @@
+"""門市資料來源：7-11 即時 / fallback 與全家，合併為單一 ResultSet。"""
+
+import math
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .cancellation import SearchCancelled, bind_cancel_token
+from .config import SEARCH_STREAM_INTERVAL_SECONDS, SEVEN_ELEVEN_DETAIL_MAX_WORKERS
+from .metrics import increment_metric
+from .results import ResultSet, build_store_key
+from .tags import categorize_mask
+from .upstream import (
+    call_with_7_11_token,
+    get_7_11_nearby_stores,
+    get_7_11_store_detail,
+    get_family_nearby_stores,
+    nearby_response_cache,
+    upstream_flights,
+)
+
+
+def get_7_11_fallback_rows(lat, lon, max_distance_km=None):
+    results = ResultSet()
+    max_distance_m = float(max_distance_km) * 1000 if max_distance_km else None
+    # fallback 資料與 NumPy 只在需要時載入
+    from .fallback import load_7_11_fallback_index
+
+    index = load_7_11_fallback_index()
+    table = index.table
+    for idx, distance_m in index.query_radius(lat, lon, max_distance_m):
+        store_idx = results.add_store(
+            "7-11",
+            table.store_id(idx),
+            table.name(idx),
+            distance_m,
+            "7-11-fallback",
+            table.address(idx),
+        )
+        results.add_item(store_idx, "靜態門市資料（未提供即期品）", 0)
+    return results
+
+
+def fetch_7_11_store_details(lat, lon, store_nos, max_workers=None, on_result=None):
+    """
+    並行取得多間 7-11 門市明細，回傳與 store_nos 同順序的 list。
+    單一門市失敗時該位置為 None，不影響其他門市。
+    on_result(store_no, detail) 會在每間門市完成時於 worker thread 呼叫。
+    """
+    max_workers = max_workers or SEVEN_ELEVEN_DETAIL_MAX_WORKERS
+
+    def fetch_one(store_no):
+        try:
+            # 同一門市同時只會有一個明細請求在途，其他搜尋共用結果
+            detail = upstream_flights.do(
+                ("7-11-detail", store_no),
+                lambda: call_with_7_11_token(get_7_11_store_detail, lat, lon, store_no),
+            )
+        except SearchCancelled:
+            raise
+        except Exception as e:
+            print(f"⚠️ 取得 7-11 門市({store_no})明細失敗，略過該門市: {e}")
+            detail = None
+        if on_result is not None:
+            on_result(store_no, detail)
+        return detail
+
+    if not store_nos:
+        return []
+    if max_workers <= 1 or len(store_nos) == 1:
+        return [fetch_one(store_no) for store_no in store_nos]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(store_nos))) as executor:
+        # executor.map 會依輸入順序回傳，確保結果排序穩定
+        return list(executor.map(bind_cancel_token(fetch_one), store_nos))
+
+
+def add_7_11_detail_items(results, store_idx, detail):
+    for cat in detail.get("CategoryStockItems", []):
+        cat_name = cat.get("Name", "")
+        for item in cat.get("ItemList", []):
+            item_name = item.get("ItemName", "")
+            item_qty = item.get("RemainingQty", 0)
+            tag_mask = categorize_mask(f"{cat_name} {item_name}")
+            results.add_item(store_idx, f"{cat_name} - {item_name}", item_qty, tag_mask=tag_mask)
+
+
+def fetch_7_11_live_rows(lat, lon, distance_km=None, known_keys=frozenset(), on_progress=None):
+    """
+    只為搜尋範圍內、且不在 known_keys（已取得的門市）中的門市查詢明細；
+    範圍外的門市最後會被 within() 濾掉，已取得的門市由呼叫端沿用既有資料。
+    on_progress(build_rows) 會在取得門市清單後與每間門市明細到達時收到產生目前結果的函式，
+    由呼叫端在需要快照時才建立 ResultSet，worker 只記錄明細；
+    明細尚未到達的門市先以附近門市清單提供的庫存數顯示一列載入中。
+    """
+    nearby_stores_711 = nearby_response_cache.get_or_fetch(
+        "7-11",
+        lat,
+        lon,
+        lambda qlat, qlon: call_with_7_11_token(get_7_11_nearby_stores, qlat, qlon),
+        lambda stores, qlat, qlon: relocate_stores(stores, qlat, qlon, "Latitude", "Longitude", "Distance"),
+    )
+    max_distance_m = float(distance_km) * 1000 if distance_km else math.inf
+    nearby_stores_711 = [
+        store
+        for store in nearby_stores_711
+        if store.get("Distance", 999999) <= max_distance_m
+        and build_store_key("7-11", store.get("StoreNo")) not in known_keys
+    ]
+    stock_store_nos = [
+        store.get("StoreNo")
+        for store in nearby_stores_711
+        if store.get("RemainingQty", 0) > 0
+    ]
+    details = {}
+    details_lock = threading.Lock()
+
+    def build_rows():
+        with details_lock:
+            details_ready = dict(details)
+        results = ResultSet()
+        for store in nearby_stores_711:
+            dist_m = store.get("Distance", 999999)
+            store_no = store.get("StoreNo")
+            store_name = store.get("StoreName", "7-11 未提供店名")
+            remaining_qty = store.get("RemainingQty", 0)
+            if remaining_qty > 0:
+                if store_no not in details_ready:
+                    # 明細尚未到達的門市標為 7-11-pending，串流中途的結果被沿用時會重新查詢
+                    store_idx = results.add_store("7-11", store_no, store_name, dist_m, "7-11-pending")
+                    results.add_item(store_idx, f"⏳ 即期品 {remaining_qty} 項明細載入中…", remaining_qty)
+                    continue
+                detail = details_ready[store_no]
+                if detail is None:
+                    continue
+                store_idx = results.add_store("7-11", store_no, store_name, dist_m, "7-11-live")
+                add_7_11_detail_items(results, store_idx, detail)
+            else:
+                store_idx = results.add_store("7-11", store_no, store_name, dist_m, "7-11-live")
+                results.add_item(store_idx, "即期品 0 項", 0)
+        return results
+
+    def on_detail(store_no, detail):
+        with details_lock:
+            details[store_no] = detail
+        on_progress(build_rows)
+
+    if on_progress is not None and stock_store_nos:
+        on_progress(build_rows)
+    fetched = fetch_7_11_store_details(
+        lat,
+        lon,
+        stock_store_nos,
+        on_result=on_detail if on_progress is not None else None,
+    )
+    with details_lock:
+        details.update(zip(stock_store_nos, fetched))
+    return build_rows()
+
+
+def relocate_stores(stores, lat, lon, lat_key, lon_key, distance_key):
+    """
+    以上游回應中的門市座標重算各門市到 (lat, lon) 的距離，供附近門市快取給同格網的其他座標使用。
+    任一門市缺少座標時回傳 None，由快取改為重新查詢。
+    """
+    from .geo import haversine_meters
+
+    relocated = []
+    for store in stores:
+        try:
+            store_lat = float(store[lat_key])
+            store_lon = float(store[lon_key])
+        except (KeyError, TypeError, ValueError):
+            return None
+        relocated.append(dict(store, **{distance_key: haversine_meters(lat, lon, store_lat, store_lon)}))
+    return relocated
+
+
+def fetch_family_rows(lat, lon):
+    results = ResultSet()
+    nearby_stores_family = nearby_response_cache.get_or_fetch(
+        "全家",
+        lat,
+        lon,
+        get_family_nearby_stores,
+        lambda stores, qlat, qlon: relocate_stores(stores, qlat, qlon, "latitude", "longitude", "distance"),
+    )
+    for store in nearby_stores_family:
+        dist_m = store.get("distance", 999999)
+        store_name = store.get("name", "全家 未提供店名")
+        info_list = store.get("info", [])
+        store_id = (
+            store.get("id")
+            or store.get("storeid")
+            or store.get("posCode")
+            or store_name
+        )
+        store_idx = results.add_store("全家", store_id, store_name, dist_m, "family-live")
+        has_item = False
+        for big_cat in info_list:
+            big_cat_name = big_cat.get("name", "")
+            for subcat in big_cat.get("categories", []):
+                subcat_name = subcat.get("name", "")
+                for product in subcat.get("products", []):
+                    product_name = product.get("name", "")
+                    qty = product.get("qty", 0)
+                    if qty > 0:
+                        has_item = True
+                        tag_mask = categorize_mask(
+                            f"{big_cat_name} {subcat_name} {product_name}"
+                        )
+                        results.add_item(
+                            store_idx,
+                            f"{big_cat_name} - {subcat_name} - {product_name}",
+                            qty,
+                            tag_mask=tag_mask,
+                        )
+        if not has_item:
+            results.add_item(store_idx, "即期品 0 項", 0)
+    return results
+
+
+# 各品牌資料來源：fetch(lat, lon, distance_km, known_keys, on_progress) 可略過 known_keys 中已取得的門市，
+# 支援的來源會以 on_progress 回報部分結果；fetch 失敗時若有 fallback 則改用 fallback 結果
+STORE_PROVIDERS = {
+    "7-11": {
+        "fetch": fetch_7_11_live_rows,
+        "fallback": get_7_11_fallback_rows,
+        "error_label": "7-11 即期品",
+    },
+    "全家": {
+        "fetch": lambda lat, lon, distance_km, known_keys, on_progress: fetch_family_rows(lat, lon),
+        "fallback": None,
+        "error_label": "全家 即期品",
+    },
+}
+
+
+def providers_for_filter(store_filter):
+    if store_filter == "只看 7-11":
+        return ["7-11"]
+    if store_filter == "只看 全家":
+        return ["全家"]
+    return list(STORE_PROVIDERS.keys())
+
+
+def run_store_provider(name, lat, lon, distance_km=None, known_keys=frozenset(), on_progress=None):
+    """
+    執行單一品牌的查詢，回傳 (rows, report)。
+    report 包含該品牌的耗時與錯誤訊息，錯誤不會往外拋出。
+    on_progress(rows) 會收到部分結果（ResultSet 或產生 ResultSet 的函式），
+    完成時（含改用 fallback）再收到最終結果。
+    """
+    provider = STORE_PROVIDERS[name]
+    started = time.perf_counter()
+    error = None
+    try:
+        rows = provider["fetch"](lat, lon, distance_km, known_keys, on_progress)
+    except SearchCancelled:
+        raise
+    except Exception as e:
+        error = str(e)
+        print(f"❌ 取得{provider['error_label']}時發生錯誤: {e}")
+        rows = provider["fallback"](lat, lon, distance_km) if provider["fallback"] else ResultSet()
+    if on_progress is not None:
+        on_progress(rows)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"⏱️ {name} 查詢完成: {len(rows)} 筆, {elapsed_ms:.0f} ms")
+    report = {
+        "provider": name,
+        "rows": len(rows),
+        "elapsed_ms": round(elapsed_ms, 1),
+        "error": error,
+        "fallback": error is not None and provider["fallback"] is not None,
+    }
+    return rows, report
+
+
+def reusable_known_rows(known, names):
+    """known 中可直接沿用的門市：屬於本次查詢品牌、且明細已取得的即時資料門市。"""
+    if not isinstance(known, ResultSet) or not known:
+        return ResultSet()
+    # fallback 門市在即時 API 恢復時應改用即時資料；載入中的門市只有佔位列，兩者都不沿用
+    return known.only_stores(
+        lambda j: known.store_types[j] in names
+        and known.store_sources[j] not in ("7-11-fallback", "7-11-pending")
+    )
+
+
+def merge_provider_rows(base, provider_rows, distance_km=None):
+    """將各品牌結果依 store_key 併入 base（不修改 base），套用距離上限後依距離排序。"""
+    known_keys = frozenset(base.store_keys)
+    results = ResultSet().extend(base)
+    for rows in provider_rows:
+        if known_keys:
+            rows = rows.only_stores(lambda j: rows.store_keys[j] not in known_keys)
+        results.extend(rows)
+
+    if distance_km:
+        results = results.within(float(distance_km) * 1000)
+
+    return results.sorted_by_distance().render_cells()
+
+
+def fetch_nearby_stores_with_reports(
+    lat, lon, distance_km=None, providers=None, known=None, on_progress=None
+):
+    """
+    同時執行多個品牌的查詢並依 providers 順序合併結果。
+    回傳 (results, reports)，reports 為各品牌的耗時與錯誤資訊。
+    known 為同一座標先前取得的結果（例如較小半徑），其中的即時資料門市直接沿用，
+    只補抓新進入範圍的門市並依 store_key 併入。
+    on_progress(name, rows) 會在各品牌有部分或最終結果時於 worker thread 呼叫，
+    部分結果可能是產生 ResultSet 的函式，呼叫端需要快照時再執行。
+    """
+    names = [name for name in (providers or STORE_PROVIDERS.keys()) if name in STORE_PROVIDERS]
+    if not names:
+        return ResultSet(), []
+
+    base = reusable_known_rows(known, names)
+    known_keys = frozenset(base.store_keys)
+    if known_keys:
+        increment_metric("nearby.reused_stores", len(known_keys))
+
+    def run(name):
+        progress = (lambda rows: on_progress(name, rows)) if on_progress is not None else None
+        return run_store_provider(name, lat, lon, distance_km, known_keys, progress)
+
+    if len(names) == 1:
+        outcomes = [run(names[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=len(names)) as executor:
+            outcomes = list(executor.map(bind_cancel_token(run), names))
+
+    results = merge_provider_rows(base, [rows for rows, _ in outcomes], distance_km)
+    return results, [report for _, report in outcomes]
+
+
+def fetch_nearby_stores_data(lat, lon, distance_km=None, providers=None, known=None):
+    results, _ = fetch_nearby_stores_with_reports(lat, lon, distance_km, providers, known)
+    return results
+
+
+def stream_nearby_stores(lat, lon, distance_km=None, providers=None, known=None):
+    """
+    以 generator 逐步產生 (results, done)：各品牌有新進度（門市清單、單店明細、整批結果）時
+    產生目前為止合併後的快照，快照間隔至少 SEARCH_STREAM_INTERVAL_SECONDS；
+    最後一筆 done 為 True，內容與 fetch_nearby_stores_data 相同。
+    """
+    names = [name for name in (providers or STORE_PROVIDERS.keys()) if name in STORE_PROVIDERS]
+    base = reusable_known_rows(known, names)
+    updates = queue.Queue()
+    outcome = {}
+
+    def run():
+        try:
+            outcome["results"], _ = fetch_nearby_stores_with_reports(
+                lat,
+                lon,
+                distance_km,
+                names,
+                known,
+                on_progress=lambda name, rows: updates.put((name, rows)),
+            )
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            updates.put(None)
+
+    worker = threading.Thread(target=bind_cancel_token(run), daemon=True)
+    worker.start()
+
+    partial = {}
+    pending = False
+    last_yield = -math.inf
+    while True:
+        wait = None
+        if pending:
+            wait = max(0.0, last_yield + SEARCH_STREAM_INTERVAL_SECONDS - time.monotonic())
+        try:
+            update = updates.get(timeout=wait)
+        except queue.Empty:
+            update = ()
+        if update is None:
+            break
+        if update:
+            name, rows = update
+            partial[name] = rows
+            pending = True
+        if pending and time.monotonic() >= last_yield + SEARCH_STREAM_INTERVAL_SECONDS:
+            # 部分結果只在節流後的快照時才建立，不在上游 worker thread 中逐筆重建
+            snapshot = [
+                partial[name]() if callable(partial[name]) else partial[name]
+                for name in names
+                if name in partial
+            ]
+            yield merge_provider_rows(base, snapshot, distance_km), False
+            last_yield = time.monotonic()
+            pending = False
+
+    worker.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    yield outcome["results"], True
@@ -0,0 +1,242 @@
+"""搜尋結果的 HTML 輸出：摘要、分頁表格，以及前端篩選模式使用的 JS。"""
+
+import html
+import math
+from collections import Counter
+
+from .config import RESULTS_PAGE_SIZE
+from .tags import TAG_BITS, TAG_ICONS, TAG_ROW_CLASSES, mask_to_tags
+
+_tag_pills_cache = {}
+
+
+def build_store_label(store_type, store_name):
+    safe_name = html.escape(store_name)
+    badge_class = "badge-711" if store_type == "7-11" else "badge-family"
+    badge_text = "7-11" if store_type == "7-11" else "全家"
+    return f"<span class='badge {badge_class}'>{badge_text}</span> {safe_name}"
+
+
+def render_error(msg: str):
+    safe_msg = html.escape(msg)
+    return f"<div class='callout callout-error'>{safe_msg}</div>"
+
+
+def render_summary(view):
+    results = view.results
+    store_indices = view.store_indices()
+    total_qty = sum(results.item_qtys[i] for i in view if results.item_qtys[i] > 0)
+    min_distance = min((results.store_distances[j] for j in store_indices), default=None)
+    nearest = f"{min_distance:.1f} m" if min_distance is not None else "—"
+    mask_counts = Counter(results.item_tag_masks[i] for i in view)
+    tag_counts = {
+        tag: sum(count for mask, count in mask_counts.items() if mask & bit)
+        for tag, bit in TAG_BITS.items()
+    }
+    tags_html = "".join(
+        f"<span class='tag-chip tag-{k}'>{TAG_ICONS.get(k, '')} {k} {v}</span>"
+        for k, v in tag_counts.items()
+        if v > 0
+    )
+    notices = []
+    if any(results.store_sources[j] == "7-11-fallback" for j in store_indices):
+        notices.append(
+            "<div class='callout callout-info'>7-11 即期品 API 暫時不可用，以下改顯示附近 7-11 靜態門市資料與地址。</div>"
+        )
+    return f"""
+    {''.join(notices)}
+    <div class='summary-bar'>
+        <div><span class='summary-label'>門市</span><span class='summary-value'>{len(store_indices)}</span></div>
+        <div><span class='summary-label'>可售商品數</span><span class='summary-value'>{total_qty}</span></div>
+        <div><span class='summary-label'>最近距離</span><span class='summary-value'>{nearest}</span></div>
+        <div><span class='summary-label'>品項分類</span><span class='summary-value tags'>{tags_html or '—'}</span></div>
+    </div>
+    """
+
+
+def page_count(total_rows, page_size=None):
+    page_size = page_size or RESULTS_PAGE_SIZE
+    return max(1, math.ceil(total_rows / page_size))
+
+
+def clamp_page(total_rows, page, page_size=None):
+    return min(max(int(page or 0), 0), page_count(total_rows, page_size) - 1)
+
+
+def render_store_cells(results, store_idx):
+    """門市與距離兩欄的 HTML，同一門市的商品列共用。"""
+    address = results.store_addresses[store_idx]
+    address_html = (
+        f"<div class='store-address'>{html.escape(address)}</div>"
+        if address
+        else ""
+    )
+    store_label = build_store_label(results.store_types[store_idx], results.store_names[store_idx])
+    return f"<td>{store_label}{address_html}</td><td>{results.store_distances[store_idx]:.1f} m</td>"
+
+
+def item_row_class(qty, tags):
+    qty_class = "qty-zero" if qty <= 0 else ""
+    tag_class = next((TAG_ROW_CLASSES[tag] for tag in tags if tag in TAG_ROW_CLASSES), "")
+    return f"{qty_class} {tag_class}"
+
+
+def render_tag_pills(mask):
+    """標籤 bitmask 對應的 tag-pill HTML；標籤組合種類有限，依 bitmask 快取共用。"""
+    tag_html = _tag_pills_cache.get(mask)
+    if tag_html is None:
+        tag_html = "".join(
+            f"<span class='tag-pill tag-{tag}'>{TAG_ICONS.get(tag, '')} {tag}</span>"
+            for tag in mask_to_tags(mask)
+        )
+        _tag_pills_cache[mask] = tag_html
+    return tag_html
+
+
+def render_item_cells(results, i):
+    """
+    商品與數量兩欄中每列不同的部分：轉義後的品項名稱與數量欄。
+    開頭的 <td> 與標籤 pill 由 render_item_row 依 bitmask 補上，pill 的 emoji 不會讓每列字串都變成 4 bytes/字元。
+    """
+    return f"{html.escape(results.item_labels[i])}</td><td class='qty-cell'>{results.item_qtys[i]}</td>"
+
+
+def render_item_row(results, i, store_cells, item_cells):
+    mask = results.item_tag_masks[i]
+    row_class = item_row_class(results.item_qtys[i], mask_to_tags(mask))
+    return f"<tr class='{row_class}'>{store_cells}<td>{render_tag_pills(mask)}{item_cells}</tr>"
+
+
+def render_table(view, page=0, page_size=None):
+    results = view.results
+    page_size = page_size or RESULTS_PAGE_SIZE
+    total_rows = len(view)
+    page = clamp_page(total_rows, page, page_size)
+    start = page * page_size
+    page_indices = view.indices[start : start + page_size]
+    body_html = "".join(results.row_fragment(i) for i in page_indices)
+    return f"""
+    <div class='table-wrap'>
+        <table class='results-table'>
+            <thead>
+                <tr>
+                    <th>門市</th>
+                    <th>距離 (m)</th>
+                    <th>商品 / 即期食品</th>
+                    <th>數量</th>
+                </tr>
+            </thead>
+            <tbody>
+                {body_html}
+            </tbody>
+        </table>
+    </div>
+    <div class='pager-info'>第 {page + 1} / {page_count(total_rows, page_size)} 頁 · 顯示第 {start + 1}–{start + len(page_indices)} 筆，共 {total_rows} 筆</div>
+    """
+
+# 前端篩選模式的瀏覽器端篩選與表格產生，邏輯對應 filter_results / render_summary / render_table
+CLIENT_FILTER_JS = """
+(raw, distance, storeFilter, under1k, onlyStock, tagInclude, tagExclude, onlyFavorites, favorites, page) => {
+    const callout = (msg) => `<div class='callout callout-error'>${msg}</div>`;
+    if (!raw) {
+        return ["", callout("❌ 尚未搜尋，請先按下「自動定位並搜尋」"), 0];
+    }
+    // 同一份結果只解析一次 JSON
+    if (!window.__nearbyPayload || window.__nearbyPayload.raw !== raw) {
+        window.__nearbyPayload = { raw, data: JSON.parse(raw) };
+    }
+    const data = window.__nearbyPayload.data;
+    const stores = data.stores;
+    const items = data.items;
+    // 標籤可能超過 32 個，bitmask 以一般數值運算判斷，不使用 32-bit 位元運算子
+    const bitValues = data.tags.map((_, bit) => 2 ** bit);
+    const bitOf = {};
+    data.tags.forEach(([tag], bit) => { bitOf[tag] = bitValues[bit]; });
+    const hasBit = (mask, value) => Math.floor(mask / value) % 2 === 1;
+    const toBits = (tags) => (tags || []).map((tag) => bitOf[tag]).filter(Boolean);
+
+    let maxDistance = Number(distance) ? Number(distance) * 1000 : Infinity;
+    if (under1k) {
+        maxDistance = Math.min(maxDistance, 1000);
+    }
+    const wantedType = { "只看 7-11": "7-11", "只看 全家": "全家" }[storeFilter] || null;
+    const favoriteSet = onlyFavorites ? new Set(favorites || []) : null;
+    const storeOk = stores.type.map(
+        (type, j) => (!wantedType || type === wantedType) && (!favoriteSet || favoriteSet.has(stores.key[j]))
+    );
+    const includeBits = toBits(tagInclude);
+    const excludeBits = toBits(tagExclude);
+
+    const rows = [];
+    for (let i = 0; i < items.store.length; i++) {
+        const j = items.store[i];
+        if (stores.dist[j] > maxDistance) break;
+        if (!storeOk[j]) continue;
+        if (onlyStock && items.qty[i] <= 0 && !stores.fallback[j]) continue;
+        const mask = items.mask[i];
+        if (includeBits.length && !includeBits.some((value) => hasBit(mask, value))) continue;
+        if (excludeBits.some((value) => hasBit(mask, value))) continue;
+        rows.push(i);
+    }
+    if (!rows.length) {
+        return ["", callout("❌ 沒有符合篩選條件的結果"), 0];
+    }
+
+    const seenStores = new Set();
+    const tagCounts = data.tags.map(() => 0);
+    let totalQty = 0;
+    let nearest = Infinity;
+    let hasFallback = false;
+    for (const i of rows) {
+        const j = items.store[i];
+        if (!seenStores.has(j)) {
+            seenStores.add(j);
+            nearest = Math.min(nearest, stores.dist[j]);
+            hasFallback = hasFallback || Boolean(stores.fallback[j]);
+        }
+        if (items.qty[i] > 0) totalQty += items.qty[i];
+        bitValues.forEach((value, bit) => {
+            if (hasBit(items.mask[i], value)) tagCounts[bit]++;
+        });
+    }
+    const tagsHtml = data.tags
+        .map(([tag, icon], bit) => tagCounts[bit] > 0 ? `<span class='tag-chip tag-${tag}'>${icon} ${tag} ${tagCounts[bit]}</span>` : "")
+        .join("");
+    const notice = hasFallback
+        ? "<div class='callout callout-info'>7-11 即期品 API 暫時不可用，以下改顯示附近 7-11 靜態門市資料與地址。</div>"
+        : "";
+    const summary = `${notice}
+    <div class='summary-bar'>
+        <div><span class='summary-label'>門市</span><span class='summary-value'>${seenStores.size}</span></div>
+        <div><span class='summary-label'>可售商品數</span><span class='summary-value'>${totalQty}</span></div>
+        <div><span class='summary-label'>最近距離</span><span class='summary-value'>${nearest.toFixed(1)} m</span></div>
+        <div><span class='summary-label'>品項分類</span><span class='summary-value tags'>${tagsHtml || "—"}</span></div>
+    </div>`;
+
+    const pageCount = Math.max(1, Math.ceil(rows.length / data.page_size));
+    const current = Math.min(Math.max(Math.trunc(Number(page) || 0), 0), pageCount - 1);
+    const start = current * data.page_size;
+    const pageRows = rows.slice(start, start + data.page_size);
+    const body = pageRows
+        .map((i) => `<tr class='${items.cls[i]}'>${stores.cells[items.store[i]]}${items.cells[i]}</tr>`)
+        .join("");
+    const table = `
+    <div class='table-wrap'>
+        <table class='results-table'>
+            <thead>
+                <tr>
+                    <th>門市</th>
+                    <th>距離 (m)</th>
+                    <th>商品 / 即期食品</th>
+                    <th>數量</th>
+                </tr>
+            </thead>
+            <tbody>
+                ${body}
+            </tbody>
+        </table>
+    </div>
+    <div class='pager-info'>第 ${current + 1} / ${pageCount} 頁 · 顯示第 ${start + 1}–${start + pageRows.length} 筆，共 ${rows.length} 筆</div>`;
+    return [summary, table, current];
+}
+"""
@@ -0,0 +1,319 @@
+"""欄式搜尋結果 ResultSet 與篩選後的 ResultView。"""
+
+import json
+import sys
+from array import array
+
+from .config import RESULTS_PAGE_SIZE
+from .render import (
+    build_store_label,
+    item_row_class,
+    render_item_cells,
+    render_item_row,
+    render_store_cells,
+    render_tag_pills,
+)
+from .tags import TAG_BITS, TAG_ICONS, mask_to_tags, tags_to_mask
+
+
+def build_store_key(store_type: str, store_id: str):
+    return f"{store_type}:{store_id}"
+
+
+def build_result_row(
+    store_type,
+    store_id,
+    store_name,
+    distance_m,
+    item_label,
+    qty,
+    tags,
+    data_source,
+    address="",
+):
+    return {
+        "store_type": store_type,
+        "store_id": store_id,
+        "store_key": build_store_key(store_type, store_id),
+        "store_name": store_name,
+        "store_label": build_store_label(store_type, store_name),
+        "distance_m": distance_m,
+        "item_label": item_label,
+        "qty": qty,
+        "tags": tags,
+        "data_source": data_source,
+        "address": address or "",
+    }
+
+
+class ResultSet:
+    """
+    欄式搜尋結果。門市層級欄位（類型、代號、名稱、距離、來源、地址）每店只存一次，
+    商品列只保存門市索引、品項名稱、數量與標籤 bitmask，取代每列一個 dict 的結構。
+    row(i) 可還原成 build_result_row 的 dict 格式。
+    搜尋流程最後會呼叫 sorted_by_distance()，之後的商品列依門市距離排序，
+    同一門市的商品列相鄰；接著以 render_cells() 預先產生門市欄位（每店一份）與商品欄位
+    （每列一份）的 HTML，換頁或切換篩選時才串接成選中列的表格列，門市 HTML 不會逐列重複保存。
+    """
+
+    __slots__ = (
+        "store_types",
+        "store_ids",
+        "store_keys",
+        "store_names",
+        "store_distances",
+        "store_sources",
+        "store_addresses",
+        "_store_lookup",
+        "item_stores",
+        "item_labels",
+        "item_qtys",
+        "store_cells",
+        "item_tag_masks",
+        "item_cells",
+    )
+
+    def __init__(self):
+        self.store_types = []
+        self.store_ids = []
+        self.store_keys = []
+        self.store_names = []
+        self.store_distances = array("d")
+        self.store_sources = []
+        self.store_addresses = []
+        self._store_lookup = {}
+        self.item_stores = array("I")
+        self.item_labels = []
+        self.item_qtys = array("q")
+        self.item_tag_masks = array("Q")
+        self.store_cells = []
+        self.item_cells = []
+
+    @classmethod
+    def from_rows(cls, rows):
+        results = cls()
+        for r in rows:
+            store_idx = results.add_store(
+                r["store_type"],
+                r["store_id"],
+                r.get("store_name") or "",
+                r["distance_m"],
+                r.get("data_source", ""),
+                r.get("address", ""),
+            )
+            results.add_item(store_idx, r["item_label"], r["qty"], r.get("tags", ()))
+        return results
+
+    def __len__(self):
+        return len(self.item_labels)
+
+    @property
+    def store_count(self):
+        return len(self.store_keys)
+
+    def add_store(self, store_type, store_id, store_name, distance_m, data_source, address="", cells=None):
+        """新增門市並回傳其索引；相同 store_key 的門市只會存一次。"""
+        key = build_store_key(store_type, store_id)
+        store_idx = self._store_lookup.get(key)
+        if store_idx is not None:
+            return store_idx
+        store_idx = len(self.store_keys)
+        self._store_lookup[key] = store_idx
+        self.store_types.append(store_type)
+        self.store_ids.append(store_id)
+        self.store_keys.append(key)
+        self.store_names.append(store_name)
+        self.store_distances.append(float(distance_m))
+        self.store_sources.append(data_source)
+        self.store_addresses.append(address or "")
+        self.store_cells.append(cells)
+        return store_idx
+
+    def add_item(self, store_idx, item_label, qty, tags=(), tag_mask=None, cells=None):
+        self.item_stores.append(store_idx)
+        self.item_labels.append(item_label)
+        self.item_qtys.append(int(qty))
+        self.item_tag_masks.append(tags_to_mask(tags) if tag_mask is None else tag_mask)
+        self.item_cells.append(cells)
+
+    def store_cell(self, store_idx):
+        cells = self.store_cells[store_idx]
+        if cells is None:
+            cells = self.store_cells[store_idx] = render_store_cells(self, store_idx)
+        return cells
+
+    def item_cell(self, i):
+        cells = self.item_cells[i]
+        if cells is None:
+            cells = self.item_cells[i] = render_item_cells(self, i)
+        return cells
+
+    def render_cells(self):
+        """預先產生尚未快取的門市欄位（每店一次）與商品欄位（每列一次）HTML。"""
+        for store_idx in range(self.store_count):
+            self.store_cell(store_idx)
+        for i in range(len(self)):
+            self.item_cell(i)
+        return self
+
+    def approx_bytes(self):
+        """估計結果集佔用的記憶體（欄位容器與其中的字串），供 session 記憶體上限計算。"""
+        total = sys.getsizeof(self) + sys.getsizeof(self._store_lookup)
+        for column in (
+            self.store_types,
+            self.store_ids,
+            self.store_keys,
+            self.store_names,
+            self.store_sources,
+            self.store_addresses,
+            self.item_labels,
+            self.store_cells,
+            self.item_cells,
+        ):
+            total += sys.getsizeof(column) + sum(sys.getsizeof(value) for value in column if value is not None)
+        for column in (self.store_distances, self.item_stores, self.item_qtys, self.item_tag_masks):
+            total += sys.getsizeof(column)
+        return total
+
+    def to_client_payload(self):
+        """
+        序列化成前端篩選用的精簡欄式 JSON。
+        門市欄位 HTML 每店只送一次，商品列只送列 class 與商品欄位 HTML，由前端組成表格列。
+        """
+        item_classes = [item_row_class(self.item_qtys[i], self.item_tags(i)) for i in range(len(self))]
+        payload = {
+            "page_size": RESULTS_PAGE_SIZE,
+            "tags": [[tag, TAG_ICONS[tag]] for tag in TAG_BITS],
+            "stores": {
+                "type": self.store_types,
+                "key": self.store_keys,
+                "dist": list(self.store_distances),
+                "fallback": [int(source == "7-11-fallback") for source in self.store_sources],
+                "cells": [self.store_cell(j) for j in range(self.store_count)],
+            },
+            "items": {
+                "store": list(self.item_stores),
+                "qty": list(self.item_qtys),
+                "mask": list(self.item_tag_masks),
+                "cls": item_classes,
+                "cells": [
+                    f"<td>{render_tag_pills(self.item_tag_masks[i])}{self.item_cell(i)}" for i in range(len(self))
+                ],
+            },
+        }
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+    def row_fragment(self, i):
+        """串接快取的門市欄位與商品欄位，產生第 i 列的表格列 HTML（不保存整列）。"""
+        return render_item_row(self, i, self.store_cell(self.item_stores[i]), self.item_cell(i))
+
+    def item_tags(self, i):
+        return mask_to_tags(self.item_tag_masks[i])
+
+    def row(self, i):
+        store_idx = self.item_stores[i]
+        return build_result_row(
+            self.store_types[store_idx],
+            self.store_ids[store_idx],
+            self.store_names[store_idx],
+            self.store_distances[store_idx],
+            self.item_labels[i],
+            self.item_qtys[i],
+            list(self.item_tags(i)),
+            self.store_sources[store_idx],
+            address=self.store_addresses[store_idx],
+        )
+
+    def rows(self, indices=None):
+        return [self.row(i) for i in (range(len(self)) if indices is None else indices)]
+
+    def extend(self, other):
+        """併入另一個 ResultSet，已存在的門市沿用原本的門市欄位。"""
+        store_map = [
+            self.add_store(
+                other.store_types[j],
+                other.store_ids[j],
+                other.store_names[j],
+                other.store_distances[j],
+                other.store_sources[j],
+                other.store_addresses[j],
+                cells=other.store_cells[j],
+            )
+            for j in range(other.store_count)
+        ]
+        for i, store_idx in enumerate(other.item_stores):
+            self.add_item(
+                store_map[store_idx],
+                other.item_labels[i],
+                other.item_qtys[i],
+                tag_mask=other.item_tag_masks[i],
+                cells=other.item_cells[i],
+            )
+        return self
+
+    def _copy_stores_items(self, store_order, keep_store=None):
+        subset = ResultSet()
+        items_by_store = [[] for _ in range(self.store_count)]
+        for i, store_idx in enumerate(self.item_stores):
+            items_by_store[store_idx].append(i)
+        for store_idx in store_order:
+            if keep_store is not None and not keep_store(store_idx):
+                continue
+            new_idx = subset.add_store(
+                self.store_types[store_idx],
+                self.store_ids[store_idx],
+                self.store_names[store_idx],
+                self.store_distances[store_idx],
+                self.store_sources[store_idx],
+                self.store_addresses[store_idx],
+                cells=self.store_cells[store_idx],
+            )
+            for i in items_by_store[store_idx]:
+                subset.add_item(
+                    new_idx,
+                    self.item_labels[i],
+                    self.item_qtys[i],
+                    tag_mask=self.item_tag_masks[i],
+                    cells=self.item_cells[i],
+                )
+        return subset
+
+    def only_stores(self, keep_store):
+        """保留 keep_store(store_idx) 為真的門市及其商品列，維持原本順序。"""
+        return self._copy_stores_items(range(self.store_count), keep_store)
+
+    def sorted_by_distance(self):
+        """回傳門市依距離排序（同距離維持原順序）、商品列依門市分組的新 ResultSet。"""
+        order = sorted(range(self.store_count), key=lambda j: self.store_distances[j])
+        return self._copy_stores_items(order)
+
+    def within(self, max_distance_m):
+        """回傳只含距離 max_distance_m 以內門市的新 ResultSet，維持原本的門市順序。"""
+        return self._copy_stores_items(
+            range(self.store_count),
+            keep_store=lambda j: self.store_distances[j] <= max_distance_m,
+        )
+
+
+class ResultView:
+    """ResultSet 上的一組商品列索引（篩選結果），不複製任何資料。"""
+
+    __slots__ = ("results", "indices")
+
+    def __init__(self, results, indices):
+        self.results = results
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __iter__(self):
+        return iter(self.indices)
+
+    def store_indices(self):
+        """依出現順序回傳不重複的門市索引。"""
+        item_stores = self.results.item_stores
+        return list(dict.fromkeys(item_stores[i] for i in self.indices))
+
+    def rows(self):
+        return self.results.rows(self.indices)
@@ -0,0 +1,102 @@
+"""各 session 搜尋結果的集中存放與執行期狀態。"""
+
+import threading
+from collections import OrderedDict
+
+from .config import SESSION_RESULTS_MAX_MB
+from .metrics import get_metrics_snapshot, increment_metric
+
+
+class ResultHandle:
+    """results_state 中保存的輕量結果參照，並記錄結果的查詢座標、半徑與品牌。"""
+
+    __slots__ = ("session_id", "version", "lat", "lon", "radius_km", "providers")
+
+    def __init__(self, session_id, version, lat, lon, radius_km, providers):
+        self.session_id = session_id
+        self.version = version
+        self.lat = lat
+        self.lon = lon
+        self.radius_km = radius_km
+        self.providers = providers
+
+
+class SessionResultStore:
+    """
+    集中存放各 session 的搜尋結果，gr.State 只保留 ResultHandle。
+    以 ResultSet.approx_bytes() 估計用量，總量超過 max_bytes 時淘汰最久未使用的 session；
+    被淘汰的 session 不在篩選或換頁時重新查詢（門市明細沒有共用快取，會很慢且庫存可能與畫面不同），
+    get() 回傳 None，由介面提示使用者重新搜尋。
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # session_id -> (version, results, nbytes)
+        self._bytes = 0
+        self._next_version = 1
+        self._lock = threading.Lock()
+
+    def put(self, session_id, results, lat, lon, radius_km, providers):
+        nbytes = results.approx_bytes()
+        with self._lock:
+            version = self._next_version
+            self._next_version += 1
+            self._store_locked(session_id, version, results, nbytes)
+        return ResultHandle(session_id, version, lat, lon, radius_km, list(providers or []))
+
+    def get(self, handle):
+        """回傳 handle 對應的結果；已被淘汰時回傳 None。"""
+        with self._lock:
+            entry = self._entries.get(handle.session_id)
+            if entry is not None and entry[0] == handle.version:
+                self._entries.move_to_end(handle.session_id)
+                return entry[1]
+
+        increment_metric("session_results.expired")
+        print(f"⌛ session 搜尋結果已被淘汰: lat={handle.lat}, lon={handle.lon}, radius={handle.radius_km}")
+        return None
+
+    def discard(self, session_id):
+        with self._lock:
+            self._remove_locked(session_id)
+
+    def stats(self):
+        with self._lock:
+            largest = sorted(self._entries.values(), key=lambda entry: entry[2], reverse=True)[:5]
+            return {
+                "sessions": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "largest_session_bytes": [entry[2] for entry in largest],
+            }
+
+    def _store_locked(self, session_id, version, results, nbytes):
+        self._remove_locked(session_id)
+        self._entries[session_id] = (version, results, nbytes)
+        self._bytes += nbytes
+        # 最新寫入的 session 位於尾端，單一 session 超過上限時仍保留
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, _, evicted_bytes) = self._entries.popitem(last=False)
+            self._bytes -= evicted_bytes
+            increment_metric("session_results.evictions")
+
+    def _remove_locked(self, session_id):
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+
+session_results = SessionResultStore(int(SESSION_RESULTS_MAX_MB * 1024 * 1024))
+
+
+def get_runtime_stats() -> dict:
+    """執行期狀態：session 搜尋結果的記憶體用量、fallback 門市資料版本、地址快取命中率與累計指標。"""
+    from .fallback import fallback_dataset
+    from .geocode import geocode_cache
+
+    return {
+        "session_results": session_results.stats(),
+        "fallback_dataset": fallback_dataset.stats(),
+        "geocode_cache": geocode_cache.stats(),
+        "metrics": get_metrics_snapshot(),
+    }
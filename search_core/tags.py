@@ -0,0 +1,139 @@
+"""品項分類：依 data/item_tags.json 的關鍵字為商品名稱標記分類 bitmask。"""
+
+import json
+from collections import deque
+from functools import lru_cache
+
+from .config import ITEM_TAGS_PATH
+
+
+# 前端篩選以 JS 數值處理標籤 bitmask，2**53 以內才能精確表示
+MAX_ITEM_TAGS = 53
+# 找不到品項分類設定檔時使用的內建分類
+DEFAULT_ITEM_TAG_CATEGORIES = [
+    {"tag": "麵", "icon": "🍜", "keywords": ["麵"], "row_class": "cat-noodle"},
+    {"tag": "湯", "icon": "🥣", "keywords": ["湯"], "row_class": "cat-soup"},
+    {"tag": "飯", "icon": "🍚", "keywords": ["飯"], "exclude": ["飯糰"], "row_class": "cat-rice"},
+    {"tag": "飯糰", "icon": "🍙", "keywords": ["飯糰"], "row_class": "cat-riceball"},
+]
+
+
+def load_item_tag_categories(path=ITEM_TAGS_PATH):
+    if not path.exists():
+        print(f"⚠️ 找不到品項分類設定: {path}，改用內建分類")
+        return DEFAULT_ITEM_TAG_CATEGORIES
+
+    with path.open("r", encoding="utf-8") as f:
+        categories = json.load(f).get("categories", [])
+    tags = [category["tag"] for category in categories]
+    if len(set(tags)) != len(tags):
+        raise ValueError(f"品項分類設定有重複的標籤: {path}")
+    if len(tags) > MAX_ITEM_TAGS:
+        raise ValueError(f"品項分類最多 {MAX_ITEM_TAGS} 個，{path} 有 {len(tags)} 個")
+    return categories
+
+
+class KeywordTagger:
+    """
+    Aho–Corasick 多關鍵字比對：啟動時把所有分類的關鍵字與排除詞編成一個自動機，
+    每個商品名稱只需從頭到尾掃描一次，成本與關鍵字數量無關。
+    命中關鍵字的分類會被標記，同一段文字命中排除詞（例如「飯」的「飯糰」）的分類則取消。
+    結果為依分類順序編號的 bitmask。
+    """
+
+    def __init__(self, categories):
+        self.tags = [category["tag"] for category in categories]
+        self._goto = [{}]
+        self._include = [0]
+        self._exclude = [0]
+        for bit, category in enumerate(categories):
+            for keyword in category.get("keywords", ()):
+                self._add(keyword, include=1 << bit)
+            for keyword in category.get("exclude", ()):
+                self._add(keyword, exclude=1 << bit)
+        self._transitions = self._build_transitions()
+
+    def _add(self, keyword, include=0, exclude=0):
+        node = 0
+        for ch in keyword:
+            child = self._goto[node].get(ch)
+            if child is None:
+                child = len(self._goto)
+                self._goto[node][ch] = child
+                self._goto.append({})
+                self._include.append(0)
+                self._exclude.append(0)
+            node = child
+        self._include[node] |= include
+        self._exclude[node] |= exclude
+
+    def _build_transitions(self):
+        # 以 BFS 建立 failure link，並展開成只含非根節點轉移的 DFA，掃描時每個字元查一次 dict
+        transitions = [dict(self._goto[0])] + [None] * (len(self._goto) - 1)
+        fail = [0] * len(self._goto)
+        pending = deque(self._goto[0].values())
+        while pending:
+            node = pending.popleft()
+            transitions[node] = {**transitions[fail[node]], **self._goto[node]}
+            for ch, child in self._goto[node].items():
+                fail[child] = transitions[fail[node]].get(ch, 0)
+                self._include[child] |= self._include[fail[child]]
+                self._exclude[child] |= self._exclude[fail[child]]
+                pending.append(child)
+        return transitions
+
+    def mask(self, text):
+        transitions = self._transitions
+        include_masks = self._include
+        exclude_masks = self._exclude
+        node = include = exclude = 0
+        for ch in text or "":
+            node = transitions[node].get(ch, 0)
+            if node:
+                include |= include_masks[node]
+                exclude |= exclude_masks[node]
+        return include & ~exclude
+
+
+ITEM_TAG_CATEGORIES = load_item_tag_categories()
+TAG_ICONS = {category["tag"]: category.get("icon", "") for category in ITEM_TAG_CATEGORIES}
+# 商品列背景色依第一個有設定 row_class 的標籤決定
+TAG_ROW_CLASSES = {
+    category["tag"]: category["row_class"]
+    for category in ITEM_TAG_CATEGORIES
+    if category.get("row_class")
+}
+item_tagger = KeywordTagger(ITEM_TAG_CATEGORIES)
+
+
+@lru_cache(maxsize=8192)
+def categorize_mask(text: str):
+    """商品名稱的標籤 bitmask；同名商品在各門市重複出現，結果以 LRU 快取。"""
+    return item_tagger.mask(text)
+
+
+def categorize_tags(text: str):
+    if not text:
+        return []
+    return list(mask_to_tags(categorize_mask(text)))
+
+
+# 每個標籤對應一個 bit，商品列只存整數 bitmask，篩選時以位元運算比對
+TAG_BITS = {tag: 1 << bit for bit, tag in enumerate(TAG_ICONS)}
+_mask_tags_cache = {}
+
+
+def tags_to_mask(tags):
+    mask = 0
+    for tag in tags or ():
+        mask |= TAG_BITS.get(tag, 0)
+    return mask
+
+
+def mask_to_tags(mask):
+    """將 bitmask 還原成依 TAG_ICONS 順序排列的標籤 tuple。"""
+    tags = _mask_tags_cache.get(mask)
+    if tags is None:
+        tags = tuple(tag for tag, bit in TAG_BITS.items() if mask & bit)
+        _mask_tags_cache[mask] = tags
+    return tags
@@ -0,0 +1,340 @@
+"""上游 API 存取：共用連線池、7-11 token、附近門市回應快取與 single-flight 合併請求。"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from .cancellation import SearchCancelled, current_cancel_token, with_cancel_token
+from .config import (
+    API_7_11_BASE,
+    API_FAMILY,
+    FAMILY_PROJECT_CODE,
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_MAXSIZE,
+    HTTP_TIMEOUT_SECONDS,
+    MID_V,
+    SEVEN_ELEVEN_TOKEN_REFRESH_MARGIN_SECONDS,
+    SEVEN_ELEVEN_TOKEN_TTL_SECONDS,
+    SPATIAL_CACHE_MAX_ENTRIES,
+    SPATIAL_CACHE_SETTINGS,
+    UPSTREAM_DEFAULT_HEADERS,
+)
+from .metrics import increment_metric
+
+
+class SingleFlight:
+    """
+    合併同一 key 同時進行中的呼叫：第一個呼叫者負責執行，
+    其他呼叫者等待並共用同一份結果（或同一個錯誤）。
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"done": threading.Event(), "result": None, "error": None}
+                self._calls[key] = call
+
+        if not leader:
+            increment_metric(f"singleflight.{self.name}.shared")
+            call["done"].wait()
+            if isinstance(call["error"], SearchCancelled):
+                # 領頭的搜尋被取消不代表這個呼叫者也被取消，改由自己重新執行
+                token = current_cancel_token()
+                if token is None or not token.cancelled:
+                    return self.do(key, fn)
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        increment_metric(f"singleflight.{self.name}.leader")
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call["done"].set()
+
+
+upstream_flights = SingleFlight("upstream")
+
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """
+    取得所有 worker thread 共用的 requests.Session。
+    連線池依 host 分開，TCP/TLS 連線會以 keep-alive 重複使用。
+    """
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                # requests 只在第一次對上游發出請求時載入
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=HTTP_POOL_MAXSIZE,
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _http_session = session
+    return _http_session
+
+
+def upstream_request(method, url, headers=None, **kwargs):
+    token = current_cancel_token()
+    if token is not None:
+        if token.cancelled:
+            increment_metric("upstream.skipped_cancelled")
+            raise SearchCancelled(f"搜尋已取消，略過 {method} {urlsplit(url).path}")
+        token.record_upstream_call()
+    merged_headers = dict(UPSTREAM_DEFAULT_HEADERS.get(urlsplit(url).hostname, {}))
+    merged_headers.update(headers or {})
+    kwargs.setdefault("timeout", HTTP_TIMEOUT_SECONDS)
+    return get_http_session().request(method, url, headers=merged_headers, **kwargs)
+
+
+class SevenElevenAuthError(RuntimeError):
+    """7-11 API 回應 token 無效或過期。"""
+
+
+def request_7_11_token():
+    url = f"{API_7_11_BASE}/Auth/FrontendAuth/AccessToken?mid_v={MID_V}"
+    resp = upstream_request("POST", url, data="")
+    resp.raise_for_status()
+    js = resp.json()
+    if not js.get("isSuccess"):
+        raise RuntimeError(f"取得 7-11 token 失敗: {js}")
+    return js["element"]
+
+
+class TokenCache:
+    """
+    行程內共用的 token 快取。
+    - 有效期間內直接回傳快取 token
+    - 接近到期時於背景更新，呼叫端仍拿到舊 token 不需等待
+    - 過期或被 invalidate 時由第一個呼叫者更新，其他呼叫者等待同一次結果
+    - 取得失敗後 failure_backoff_seconds 內直接回報同一個錯誤，不重複打上游
+    """
+
+    def __init__(self, fetch, ttl_seconds, refresh_margin_seconds, failure_backoff_seconds=30):
+        self._fetch = fetch
+        self._ttl = ttl_seconds
+        self._margin = min(refresh_margin_seconds, ttl_seconds)
+        self._failure_backoff = failure_backoff_seconds
+        self._entry = None  # (token, expires_at)，整組替換避免讀到一半的狀態
+        self._failure = None  # (error, retry_at)
+        self._refresh_lock = threading.Lock()
+        self._background_lock = threading.Lock()
+        self._background_running = False
+
+    def get(self):
+        entry = self._entry
+        now = time.monotonic()
+        if entry and now < entry[1]:
+            if now >= entry[1] - self._margin:
+                self._start_background_refresh()
+            return entry[0]
+
+        with self._refresh_lock:
+            entry = self._entry
+            if entry and time.monotonic() < entry[1]:
+                return entry[0]
+            return self._refresh_locked()
+
+    def invalidate(self, token):
+        entry = self._entry
+        if entry and entry[0] == token:
+            self._entry = None
+
+    def _refresh_locked(self):
+        failure = self._failure
+        if failure and time.monotonic() < failure[1]:
+            raise RuntimeError(f"7-11 token 暫時無法取得: {failure[0]}")
+        try:
+            # token 為所有 session 共用，不因單一搜尋被取消而中斷
+            token = with_cancel_token(None, self._fetch)
+        except Exception as e:
+            self._failure = (e, time.monotonic() + self._failure_backoff)
+            raise
+        self._failure = None
+        self._entry = (token, time.monotonic() + self._ttl)
+        return token
+
+    def _start_background_refresh(self):
+        with self._background_lock:
+            if self._background_running:
+                return
+            self._background_running = True
+        threading.Thread(target=self._background_refresh, daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            with self._refresh_lock:
+                entry = self._entry
+                if entry and time.monotonic() < entry[1] - self._margin:
+                    return
+                self._refresh_locked()
+                print("🔄 已於背景更新 7-11 token")
+        except Exception as e:
+            print(f"⚠️ 背景更新 7-11 token 失敗，沿用現有 token: {e}")
+        finally:
+            with self._background_lock:
+                self._background_running = False
+
+
+seven_eleven_token_cache = TokenCache(
+    request_7_11_token,
+    SEVEN_ELEVEN_TOKEN_TTL_SECONDS,
+    SEVEN_ELEVEN_TOKEN_REFRESH_MARGIN_SECONDS,
+)
+
+
+def get_7_11_token():
+    return seven_eleven_token_cache.get()
+
+
+def call_with_7_11_token(fn, *args):
+    """以快取 token 呼叫 7-11 API；若回應 token 失效則更新 token 後重試一次。"""
+    token = get_7_11_token()
+    try:
+        return fn(token, *args)
+    except SevenElevenAuthError as e:
+        print(f"🔑 7-11 token 失效，重新取得後重試: {e}")
+        seven_eleven_token_cache.invalidate(token)
+        return fn(get_7_11_token(), *args)
+
+
+def raise_for_7_11_status(resp):
+    if resp.status_code in (401, 403):
+        raise SevenElevenAuthError(f"HTTP {resp.status_code}")
+    resp.raise_for_status()
+
+
+def get_7_11_nearby_stores(token, lat, lon):
+    url = f"{API_7_11_BASE}/Search/FrontendStoreItemStock/GetNearbyStoreList?token={token}"
+    headers = {"content-type": "application/json"}
+    body = {
+        "CurrentLocation": {"Latitude": lat, "Longitude": lon},
+        "SearchLocation": {"Latitude": lat, "Longitude": lon}
+    }
+    resp = upstream_request("POST", url, headers=headers, json=body)
+    raise_for_7_11_status(resp)
+    js = resp.json()
+    if not js.get("isSuccess"):
+        raise RuntimeError(f"取得 7-11 附近門市失敗: {js}")
+    return js["element"].get("StoreStockItemList", [])
+
+
+def get_7_11_store_detail(token, lat, lon, store_no):
+    url = f"{API_7_11_BASE}/Search/FrontendStoreItemStock/GetStoreDetail?token={token}"
+    headers = {"content-type": "application/json"}
+    body = {
+        "CurrentLocation": {"Latitude": lat, "Longitude": lon},
+        "StoreNo": store_no
+    }
+    resp = upstream_request("POST", url, headers=headers, json=body)
+    raise_for_7_11_status(resp)
+    js = resp.json()
+    if not js.get("isSuccess"):
+        raise RuntimeError(f"取得 7-11 門市({store_no})資料失敗: {js}")
+    return js["element"].get("StoreStockItem", {})
+
+
+class SpatialResponseCache:
+    """
+    行程內共用、以經緯度格網為 key 的短效快取。
+    上游一律以呼叫者的實際座標查詢，快取項目記錄該查詢座標；
+    同一格網內其他座標的查詢只在 relocate 能以門市座標重算距離時共用回應，否則重新查詢。
+    """
+
+    def __init__(self, settings, max_entries):
+        self.settings = settings
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def cell_for(self, provider, lat, lon):
+        cell_deg = self.settings[provider]["cell_deg"]
+        return (provider, math.floor(lat / cell_deg), math.floor(lon / cell_deg))
+
+    def get_or_fetch(self, provider, lat, lon, fetch, relocate=None):
+        """
+        fetch(lat, lon) 以呼叫者的座標查詢上游。
+        relocate(value, lat, lon) 回傳距離改以 (lat, lon) 重算的回應，無法重算（缺門市座標）時回傳 None。
+        """
+        settings = self.settings.get(provider)
+        if not settings or settings["ttl_seconds"] <= 0 or settings["cell_deg"] <= 0:
+            return upstream_flights.do(("nearby", provider, lat, lon), lambda: fetch(lat, lon))
+
+        key = self.cell_for(provider, lat, lon)
+        cached = self._serve(key, lat, lon, relocate)
+        if cached is not None:
+            increment_metric(f"spatial_cache.{provider}.hits")
+            print(f"🗺️ {provider} 附近門市快取命中 cell={key[1]},{key[2]}")
+            return cached[0]
+
+        increment_metric(f"spatial_cache.{provider}.misses")
+
+        def fetch_and_store():
+            # 等待領頭請求期間可能已有相同座標的請求寫入快取
+            cached = self._serve(key, lat, lon, relocate)
+            if cached is not None:
+                return cached[0]
+            value = fetch(lat, lon)
+            with self._lock:
+                self._entries[key] = (time.monotonic() + settings["ttl_seconds"], (lat, lon), value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return value
+
+        return upstream_flights.do(("nearby", provider, lat, lon), fetch_and_store)
+
+    def _serve(self, key, lat, lon, relocate):
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry or time.monotonic() >= entry[0]:
+                return None
+            self._entries.move_to_end(key)
+        _, origin, value = entry
+        if origin == (lat, lon):
+            return (value,)
+        relocated = relocate(value, lat, lon) if relocate is not None else None
+        return (relocated,) if relocated is not None else None
+
+
+nearby_response_cache = SpatialResponseCache(SPATIAL_CACHE_SETTINGS, SPATIAL_CACHE_MAX_ENTRIES)
+
+
+def get_family_nearby_stores(lat, lon):
+    headers = {"Content-Type": "application/json;charset=utf-8"}
+    body = {
+        "ProjectCode": FAMILY_PROJECT_CODE,
+        "latitude": lat,
+        "longitude": lon
+    }
+    resp = upstream_request("POST", API_FAMILY, headers=headers, json=body)
+    resp.raise_for_status()
+    js = resp.json()
+    if js.get("code") != 1:
+        raise RuntimeError(f"取得全家門市資料失敗: {js}")
+    return js["data"]